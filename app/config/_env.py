@@ -0,0 +1,25 @@
+import os
+import functools
+from pathlib import Path
+from types import MappingProxyType
+
+
+@functools.lru_cache(maxsize=1)
+def load_env_once() -> MappingProxyType:
+    """
+    Carrega o arquivo .env (se existir) uma única vez por processo
+    
+    Returns:
+        MappingProxyType: Snapshot somente leitura das variáveis de ambiente
+    """
+    try:
+        from dotenv import load_dotenv
+        # Carregar .env se existir
+        env_path = Path('.env')
+        if env_path.exists():
+            load_dotenv(env_path)
+    except ImportError:
+        # python-dotenv não instalado, usar apenas variáveis de ambiente do sistema
+        pass
+    
+    return MappingProxyType(dict(os.environ))
@@ -0,0 +1,26 @@
+"""
+Clientes AWS compartilhados entre os serviços (um por serviço e credencial)
+"""
+
+import boto3
+import streamlit as st
+from botocore.config import Config
+
+# Configuração compartilhada pelos clientes AWS (pool maior para uso concorrente)
+AWS_CLIENT_CONFIG = Config(
+    max_pool_connections=50,
+    retries={'mode': 'adaptive', 'max_attempts': 10},
+    tcp_keepalive=True
+)
+
+
+@st.cache_resource
+def get_client(service: str, access_key: str, secret_key: str, region: str):
+    """Cria (uma única vez por serviço e credencial) um cliente AWS reutilizado entre reruns"""
+    return boto3.client(
+        service,
+        aws_access_key_id=access_key,
+        aws_secret_access_key=secret_key,
+        region_name=region,
+        config=AWS_CLIENT_CONFIG
+    )
@@ -0,0 +1,35 @@
+import atexit
+import functools
+import logging
+import queue
+import sys
+from logging.handlers import QueueHandler, QueueListener
+
+LOG_FORMAT = '%(asctime)s %(levelname)s %(name)s: %(message)s'
+
+
+@functools.lru_cache(maxsize=1)
+def setup_logging_once(level: int = logging.INFO) -> QueueListener:
+    """
+    Configura o logger da aplicação uma única vez por processo
+
+    As mensagens entram numa fila e uma thread dedicada escreve no stdout, para que
+    formatação e escrita não bloqueiem as threads do Streamlit.
+
+    Returns:
+        QueueListener: Listener que esvazia a fila
+    """
+    log_queue = queue.SimpleQueue()
+
+    stream_handler = logging.StreamHandler(sys.stdout)
+    stream_handler.setFormatter(logging.Formatter(LOG_FORMAT))
+    listener = QueueListener(log_queue, stream_handler, respect_handler_level=True)
+    listener.start()
+    atexit.register(listener.stop)
+
+    app_logger = logging.getLogger('app')
+    app_logger.addHandler(QueueHandler(log_queue))
+    app_logger.setLevel(level)
+    app_logger.propagate = False
+
+    return listener
@@ -0,0 +1,21 @@
+"""
+Opções fixas da tela de upload
+
+Ficam em um módulo importado (e não no script da página) para não serem
+recriadas a cada rerun do Streamlit.
+"""
+
+from types import MappingProxyType
+
+# Extensões aceitas pelo file_uploader
+UPLOAD_FILE_TYPES = ("csv", "xlsx", "xls")
+
+# Separadores de CSV oferecidos ao usuário
+SEP_OPTIONS = MappingProxyType({
+    "Vírgula (,)": ",",
+    "Ponto e vírgula (;)": ";",
+    "Tab": "\t",
+    "Pipe (|)": "|",
+    "Detectar automaticamente": "auto"
+})
+SEP_CHOICES = tuple(SEP_OPTIONS)
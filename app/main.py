@@ -1,6 +1,7 @@
 import streamlit as st
 import sys
 import os
+import pandas as pd
 
 # Configuração de paths
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))) if '__file__' in globals() else os.getcwd())
@@ -8,12 +9,17 @@ sys.path.append(os.path.dirname(os.path.abspath(__file__)) if '__file__' in glob
 
 # Imports dos serviços
 from app.services.validation_service import ValidationService
-from app.services.file_service import FileProcessingService
-from app.services.uploader_service import S3UploaderService
+from app.services.file_service import get_file_service
+from app.services.uploader_service import get_uploader_service
 from app.services.auth_service import init_session_state, is_authenticated, get_current_user, require_auth
 from app.ui.sidebar import render_sidebar
 from app.ui.athena_page import render_athena_page
 from app.config.s3_config import s3_config
+from app.config.upload_options import UPLOAD_FILE_TYPES, SEP_OPTIONS, SEP_CHOICES
+from app.config.logging_config import setup_logging_once
+
+# Logs da aplicação (fila + thread dedicada)
+setup_logging_once()
 
 # Configuração da página
 st.set_page_config(page_title="Upload de Arquivos - Data Platform", layout="wide")
@@ -48,8 +54,8 @@ if menu == "Upload de Arquivo":
 
     # Inicializar serviços
     validation_service = ValidationService()
-    file_service = FileProcessingService()
-    uploader_service = S3UploaderService()
+    file_service = get_file_service()
+    uploader_service = get_uploader_service()
 
     # Seção de categorização
     st.subheader("🎯 Categorização dos Dados")
@@ -96,7 +102,7 @@ if menu == "Upload de Arquivo":
     # Upload de arquivo
     uploaded_file = st.file_uploader(
         "Selecione um arquivo CSV ou Excel", 
-        type=["csv", "xlsx", "xls"],
+        type=UPLOAD_FILE_TYPES,
         help="Formatos suportados: CSV, Excel (.xlsx, .xls)"
     )
 
@@ -110,15 +116,8 @@ if menu == "Upload de Arquivo":
             with st.expander("📄 Configurações CSV", expanded=True):
                 col1, col2 = st.columns(2)
                 with col1:
-                    sep_options = {
-                        "Vírgula (,)": ",",
-                        "Ponto e vírgula (;)": ";", 
-                        "Tab": "\t",
-                        "Pipe (|)": "|",
-                        "Detectar automaticamente": "auto"
-                    }
-                    sep_choice = st.selectbox("Separador de colunas:", options=list(sep_options.keys()))
-                    sep = sep_options[sep_choice]
+                    sep_choice = st.selectbox("Separador de colunas:", options=SEP_CHOICES)
+                    sep = SEP_OPTIONS[sep_choice]
                     
                 with col2:
                     header_row = st.number_input("Linha do cabeçalho (0-indexada):", min_value=0, value=0)
@@ -179,17 +178,18 @@ if menu == "Upload de Arquivo":
                     # Tipos de dados amigáveis
                     st.markdown("### 🏷️ Colunas encontradas")
                     from app.models.file_info import ProcessedFileInfo
-                    processed_info = ProcessedFileInfo(
-                        columns_detected=file_info['colunas_detectadas'],
-                        columns_with_types=file_info['colunas_com_tipos'],
+                    processed_info = ProcessedFileInfo.from_dtypes(
+                        pd.Series(file_info['colunas_com_tipos'], dtype=object),
                         total_rows_estimated=file_info['total_linhas_estimado'],
                         format=file_info['formato'],
                         sheet_used=file_info.get('aba_usada')
                     )
                     
-                    for col, dtype in file_info["colunas_com_tipos"].items():
-                        tipo_amigavel = processed_info.get_friendly_type(dtype)
-                        st.write(f"**{col}:** {tipo_amigavel}")
+                    columns_display = [
+                        {'Coluna': col, 'Tipo': friendly}
+                        for col, friendly in processed_info.friendly_types.items()
+                    ]
+                    st.dataframe(columns_display, use_container_width=True, hide_index=True)
 
             # Preview do destino S3
             if selected_subject and selected_sub_subject and uploader_service.is_available():
@@ -202,22 +202,34 @@ if menu == "Upload de Arquivo":
             st.subheader("🛡️ Validação dos Dados")
             
             if schema:
-                errors = validation_service.validate_data(df_preview, schema)
+                # Leitura completa do arquivo (uma única vez, reaproveitada no upload)
+                file_data = file_service.load_file_data(
+                    uploaded_file, sep, header_row, sheet_name if file_extension != 'csv' else None
+                )
+                errors = validation_service.validate_data(file_data, schema)
                 
                 if errors:
-                    st.error("❌ Foram encontrados erros no arquivo:")
-                    for err in errors:
-                        st.write(f"• {err}")
+                    st.error(f"❌ Foram encontrados {len(errors)} erro(s) no arquivo:")
+                    st.dataframe(
+                        [{'Erro': err} for err in errors],
+                        use_container_width=True,
+                        hide_index=True
+                    )
                         
                     # Mostrar campos esperados
                     with st.expander("📋 Campos esperados pelo schema", expanded=False):
                         expected_fields = schema.get('schema', {}).get('fields', [])
                         
-                        for field in expected_fields:
-                            required_badge = "🔴 Obrigatório" if field.get('required', False) else "⚪ Opcional"
-                            st.write(f"**{field['name']}** ({field.get('type', 'str')}) - {required_badge}")
-                            if field.get('description'):
-                                st.caption(field['description'])
+                        fields_display = [
+                            {
+                                'Campo': field['name'],
+                                'Tipo': field.get('type', 'str'),
+                                'Obrigatoriedade': "🔴 Obrigatório" if field.get('required', False) else "⚪ Opcional",
+                                'Descrição': field.get('description', '')
+                            }
+                            for field in expected_fields
+                        ]
+                        st.dataframe(fields_display, use_container_width=True, hide_index=True)
                                 
                 else:
                     st.success("✅ Arquivo válido de acordo com o schema selecionado!")
@@ -228,7 +240,8 @@ if menu == "Upload de Arquivo":
                             with st.spinner("Enviando arquivo..."):
                                 try:
                                     success, message = uploader_service.upload_file(
-                                        uploaded_file, schema, selected_subject, selected_sub_subject
+                                        uploaded_file, schema, selected_subject, selected_sub_subject,
+                                        data=file_data
                                     )
                                     
                                     if success:
@@ -263,16 +276,20 @@ if menu == "Upload de Arquivo":
         if should_load_history:
             with st.spinner("Carregando histórico de uploads..."):
                 try:
-                    from app.services.s3_history_service import S3HistoryManager
+                    from app.services.s3_history_service import get_history_manager
                     
                     credentials = s3_config.get_credentials()
-                    history_manager = S3HistoryManager(
+                    history_manager = get_history_manager(
                         credentials['aws_access_key_id'],
                         credentials['aws_secret_access_key'],
                         credentials['bucket_name'],
                         credentials['region_name']
                     )
                     
+                    # Após upload ou atualização manual, ignorar o histórico cacheado
+                    if st.session_state.get('upload_history_refresh', False):
+                        history_manager.invalidate_cache()
+                    
                     history_list = history_manager.get_upload_history(limit=20)
                     
                     if history_list:
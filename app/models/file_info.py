@@ -1,9 +1,44 @@
-from dataclasses import dataclass
+import re
+import sys
+from dataclasses import dataclass, field
 from datetime import datetime
 from typing import Optional, Dict, Any
 
+import pandas as pd
 
-@dataclass
+
+_KIB = 1 << 10
+_MIB = 1 << 20
+
+# Descrições amigáveis indexadas pelo prefixo do dtype (int64, float64, datetime64[ns]...)
+_DTYPE_FRIENDLY = {
+    'int': "Números inteiros",
+    'uint': "Números inteiros",
+    'float': "Números decimais",
+    'object': "Texto",
+    'datetime': "Data/Hora",
+    'bool': "Verdadeiro/Falso",
+}
+_DTYPE_PREFIX_PATTERN = r'^(' + '|'.join(_DTYPE_FRIENDLY) + ')'
+
+# Categorias do schema em ordem de prioridade: cada lookahead testa o nome
+# inteiro, então a primeira categoria presente vence (como no if/elif original)
+_ICON_PATTERN = re.compile(
+    r'^(?:(?=.*(vendas))|(?=.*(financeiro))|(?=.*(rh|funcionario))|(?=.*(sistema|user)))',
+    re.IGNORECASE | re.DOTALL
+)
+_ICON_TABLE = ("💰", "💳", "👥", "⚙️")
+
+
+def _intern_fields(instance, names) -> None:
+    """Compartilha uma única cópia de campos texto muito repetidos entre as instâncias"""
+    for name in names:
+        value = getattr(instance, name)
+        if type(value) is str:
+            object.__setattr__(instance, name, sys.intern(value))
+
+
+@dataclass(slots=True, frozen=True)
 class FileInfo:
     """Modelo para informações de arquivo"""
     
@@ -12,18 +47,25 @@ class FileInfo:
     file_type: str
     extension: str
     
+    def __post_init__(self):
+        _intern_fields(self, ('file_type', 'extension'))
+    
     @property
     def size_formatted(self) -> str:
         """Retorna tamanho formatado"""
-        if self.size < 1024:
-            return f"{self.size} bytes"
-        elif self.size < 1024 * 1024:
-            return f"{self.size / 1024:.1f} KB"
-        else:
-            return f"{self.size / (1024 * 1024):.1f} MB"
+        size = self.size
+        if size < _KIB:
+            return f"{size} bytes"
+        
+        # Décimos em aritmética inteira, arredondando como o ':.1f' (meio para o par)
+        divisor, unit = (_KIB, "KB") if size < _MIB else (_MIB, "MB")
+        tenths, remainder = divmod(size * 10, divisor)
+        if remainder * 2 > divisor or (remainder * 2 == divisor and tenths % 2):
+            tenths += 1
+        return f"{tenths // 10}.{tenths % 10} {unit}"
 
 
-@dataclass
+@dataclass(slots=True, frozen=True)
 class ProcessedFileInfo:
     """Modelo para informações de arquivo processado"""
     
@@ -32,24 +74,38 @@ class ProcessedFileInfo:
     total_rows_estimated: int
     format: str
     sheet_used: Optional[str] = None
+    friendly_types: Dict[str, str] = field(default_factory=dict, compare=False)
+    
+    @classmethod
+    def from_dtypes(cls, dtypes: pd.Series, total_rows_estimated: int, format: str,
+                    sheet_used: Optional[str] = None) -> 'ProcessedFileInfo':
+        """Cria a partir de uma Series coluna -> dtype, convertendo todos os tipos de uma vez"""
+        dtype_names = dtypes.astype(str)
+        friendly = (
+            dtype_names.str.lower()
+            .str.extract(_DTYPE_PREFIX_PATTERN, expand=False)
+            .map(_DTYPE_FRIENDLY)
+            .fillna(dtype_names)
+        )
+        return cls(
+            columns_detected=len(dtypes),
+            columns_with_types=dict(zip(dtypes.index, dtype_names)),
+            total_rows_estimated=total_rows_estimated,
+            format=format,
+            sheet_used=sheet_used,
+            friendly_types=dict(zip(dtypes.index, friendly)),
+        )
     
     def get_friendly_type(self, dtype: str) -> str:
         """Converte tipos técnicos para descrições amigáveis"""
-        if 'int' in dtype.lower():
-            return "Números inteiros"
-        elif 'float' in dtype.lower():
-            return "Números decimais"
-        elif 'object' in dtype.lower():
-            return "Texto"
-        elif 'datetime' in dtype.lower():
-            return "Data/Hora"
-        elif 'bool' in dtype.lower():
-            return "Verdadeiro/Falso"
-        else:
-            return str(dtype)
-
-
-@dataclass
+        dtype_lower = dtype.lower()
+        for prefix, label in _DTYPE_FRIENDLY.items():
+            if dtype_lower.startswith(prefix):
+                return label
+        return dtype
+
+
+@dataclass(slots=True, frozen=True)
 class UploadMetadata:
     """Modelo para metadata de upload"""
     
@@ -64,11 +120,14 @@ class UploadMetadata:
     original_format: str
     processed_by: str = "data-platform-upload-system"
     
+    def __post_init__(self):
+        _intern_fields(self, ('schema_used', 'subject', 'sub_subject', 'original_format', 'processed_by'))
+    
     def to_dict(self) -> Dict[str, str]:
         """Converte para dicionário de strings (para S3 metadata)"""
         return {
             'original_filename': self.original_filename,
-            'upload_timestamp': self.upload_timestamp.isoformat(),
+            'upload_timestamp': _format_timestamp(self.upload_timestamp),
             'schema_used': self.schema_used,
             'subject': self.subject,
             'sub_subject': self.sub_subject,
@@ -80,7 +139,18 @@ class UploadMetadata:
         }
 
 
-@dataclass
+# Formato fixo dos timestamps sem fuso (sempre com microssegundos)
+_TS_FMT = '%Y-%m-%dT%H:%M:%S.%f'
+
+
+def _format_timestamp(value: datetime) -> str:
+    """Formata o timestamp do upload em ISO 8601"""
+    if value.tzinfo is None:
+        return value.strftime(_TS_FMT)
+    return value.isoformat()
+
+
+@dataclass(slots=True, frozen=True)
 class S3FileInfo:
     """Modelo para informações de arquivo no S3"""
     
@@ -93,23 +163,23 @@ class S3FileInfo:
     row_count: int
     column_count: int
     upload_timestamp: str
+    _file_size_mb: float = field(init=False, repr=False, compare=False)
+    _category_icon: str = field(init=False, repr=False, compare=False)
+    
+    def __post_init__(self):
+        _intern_fields(self, ('schema_used',))
+        
+        # Valores derivados calculados uma vez (a instância é imutável)
+        object.__setattr__(self, '_file_size_mb', round(self.file_size_bytes / (1024 * 1024), 2))
+        
+        match = _ICON_PATTERN.match(self.schema_used)
+        object.__setattr__(self, '_category_icon', _ICON_TABLE[match.lastindex - 1] if match else "📄")
     
     @property
     def file_size_mb(self) -> float:
         """Retorna tamanho em MB"""
-        return round(self.file_size_bytes / (1024 * 1024), 2)
+        return self._file_size_mb
     
     def get_category_icon(self) -> str:
         """Retorna ícone baseado no schema"""
-        schema_lower = self.schema_used.lower()
-        
-        if 'vendas' in schema_lower:
-            return "💰"
-        elif 'financeiro' in schema_lower:
-            return "💳"
-        elif 'rh' in schema_lower or 'funcionario' in schema_lower:
-            return "👥"
-        elif 'sistema' in schema_lower or 'user' in schema_lower:
-            return "⚙️"
-        else:
-            return "📄" 
\ No newline at end of file
+        return self._category_icon
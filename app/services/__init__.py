@@ -1,8 +1,13 @@
-from .validation_service import ValidationService
-from .file_service import FileProcessingService
-from .uploader_service import S3UploaderService
-from .s3_history_service import S3HistoryManager
-from .athena_service import AthenaService
+import importlib
+
+# Serviços carregados sob demanda (PEP 562): importar o pacote não puxa boto3/duckdb
+_LAZY = {
+    'ValidationService': '.validation_service',
+    'FileProcessingService': '.file_service',
+    'S3UploaderService': '.uploader_service',
+    'S3HistoryManager': '.s3_history_service',
+    'AthenaService': '.athena_service',
+}
 
 __all__ = [
     'ValidationService',
@@ -10,4 +15,19 @@ __all__ = [
     'S3UploaderService',
     'S3HistoryManager',
     'AthenaService'
-] 
\ No newline at end of file
+]
+
+
+def __getattr__(name):
+    try:
+        module_name = _LAZY[name]
+    except KeyError:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}") from None
+    
+    value = getattr(importlib.import_module(module_name, __name__), name)
+    globals()[name] = value
+    return value
+
+
+def __dir__():
+    return sorted(set(globals()) | set(__all__))
@@ -1,12 +1,177 @@
-import boto3
+import functools
+import hashlib
+import re
 import duckdb
+import io
+import os
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
 import time
-from datetime import datetime
-from typing import List, Dict, Optional, Tuple
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+from typing import List, Dict, Optional, Set, Tuple
+from app.config.aws_clients import get_client
 from app.config.s3_config import s3_config
 import json
+import logging
 import streamlit as st
 
+try:
+    import orjson
+    _json_loads = orjson.loads
+except ImportError:
+    _json_loads = json.loads
+
+logger = logging.getLogger(__name__)
+
+# Intervalo entre consultas de status da query: começa curto e cresce até o teto
+QUERY_POLL_INITIAL_DELAY = 0.05
+QUERY_POLL_MAX_DELAY = 2.0
+QUERY_POLL_BACKOFF = 1.5
+
+# Metadados (databases, tabelas, schemas) ficam em cache por este tempo ou até um DDL
+METADATA_CACHE_TTL = 30
+_DDL_RE = re.compile(r'^\s*(?:CREATE|DROP|ALTER)\b', re.IGNORECASE)
+# Registrar partição não muda databases, tabelas nem schemas (roda a cada edição salva no log)
+_ADD_PARTITION_RE = re.compile(
+    r'^\s*ALTER\s+TABLE\s+\S+\s+ADD\s+(?:IF\s+NOT\s+EXISTS\s+)?PARTITION\b', re.IGNORECASE
+)
+
+# Palavras que identificam a coluna de ID das linhas editadas
+ID_COLUMN_KEYWORDS = ('id', 'key', 'pk')
+
+
+@functools.lru_cache(maxsize=256)
+def _pick_id_column(columns: Tuple[str, ...]) -> Optional[str]:
+    """Escolhe a coluna de ID (primeira que parece um ID, senão a primeira coluna)"""
+    for col in columns:
+        col_lower = col.lower()
+        if any(keyword in col_lower for keyword in ID_COLUMN_KEYWORDS):
+            return col
+    return columns[0] if columns else None
+
+
+# Formatos de tabela que podem ser modificados: nomes de classe Hive (minúsculas),
+# completos ou só a parte final
+SUPPORTED_INPUT_FORMATS = frozenset({
+    'org.apache.hadoop.mapred.textinputformat', 'textinputformat',
+    'org.apache.hadoop.hive.ql.io.parquet.mapredparquetinputformat', 'mapredparquetinputformat',
+    'parquet',
+})
+SUPPORTED_SERDES = frozenset({
+    'org.apache.hadoop.hive.serde2.lazy.lazysimpleserde', 'lazysimpleserde',
+    'org.apache.hadoop.hive.ql.io.parquet.serde.parquethiveserde', 'parquethiveserde',
+    'parquet',
+})
+
+
+def _is_supported_class(class_name: str, supported: frozenset) -> bool:
+    """Verifica o nome completo da classe e, se não bater, só o nome final"""
+    return class_name in supported or class_name.rsplit('.', 1)[-1] in supported
+
+
+# Partições da tabela de log (pastas database_name=.../table_name=.../ingest_date=... no S3)
+CHANGES_LOG_PARTITION_KEYS = ('database_name', 'table_name', 'ingest_date')
+
+
+def _changes_log_prefix(database: str, table: Optional[str] = None) -> str:
+    """Prefixo S3 do log de um database (ou das partições de uma tabela)"""
+    prefix = f"data-changes-log/{database}/"
+    if table is None:
+        return prefix
+    return f"{prefix}database_name={database}/table_name={table}/"
+
+
+def _log_cleanup_error(future) -> None:
+    """Registra a falha de uma limpeza em segundo plano (opcional - pode falhar sem problemas)"""
+    error = future.exception()
+    if error is not None:
+        logger.warning("Erro ao limpar arquivos S3 antigos: %s", error)
+
+
+# (bucket, database) cuja tabela de log já foi confirmada (existe e está no formato atual).
+# Sobrevive à invalidação dos metadados por DDL; é descartado quando o Athena indica que a
+# tabela sumiu ou quando ela é recriada
+_confirmed_log_tables: Set[Tuple[str, str]] = set()
+
+
+# Leitura direta dos arquivos do log no S3 (downloads em paralelo, cliente compartilhado)
+LOG_FETCH_WORKERS = 16
+CHANGES_LOG_LIMIT = 100
+
+# Chamadas delete_objects simultâneas ao limpar os arquivos do log
+LOG_DELETE_WORKERS = 8
+
+# Limpezas do S3 rodam fora da requisição, uma por vez, numa thread compartilhada
+_background_cleanup = ThreadPoolExecutor(max_workers=1, thread_name_prefix='log-cleanup')
+
+# Campos dos STRUCTs before/after da tabela de log, na ordem do DDL
+LOG_STRUCT_FIELDS = ('id', 'first_name', 'last_name', 'email', 'gender', 'ip_address', 'is_active', 'data')
+_LOG_STRUCT_TYPE = pa.struct([(name, pa.string()) for name in LOG_STRUCT_FIELDS])
+
+
+def _to_log_struct(row: Dict) -> Optional[Dict[str, str]]:
+    """Converte uma linha para os valores do STRUCT do log (None = STRUCT vazio)"""
+    if not row:
+        return None
+    
+    # Campos ausentes ou None viram string vazia
+    return {field: '' if row.get(field) is None else str(row[field]) for field in LOG_STRUCT_FIELDS}
+
+
+def _from_log_struct(value) -> Dict[str, str]:
+    """Lê um STRUCT do log: dicionário (Parquet lido do S3) ou JSON (consulta no Athena)"""
+    if not value:
+        return {}
+    
+    if isinstance(value, str):
+        value = _json_loads(value)
+    
+    return {key: '' if item is None else item for key, item in value.items()}
+
+
+# Schema Parquet dos arquivos da tabela de log (mesma ordem e tipos do DDL)
+CHANGES_LOG_SCHEMA = pa.schema([
+    ('id', pa.string()),
+    ('table_name', pa.string()),
+    ('database_name', pa.string()),
+    ('operation', pa.string()),
+    ('row_identifier', pa.string()),
+    ('before', _LOG_STRUCT_TYPE),
+    ('after', _LOG_STRUCT_TYPE),
+    ('updated_by', pa.string()),
+    ('updated_at', pa.string()),
+    ('session_id', pa.string()),
+    ('change_reason', pa.string()),
+])
+
+
+# DDL das tabelas criadas a partir de arquivos (CSV com sintaxe correta do Athena)
+_CSV_TABLE_DDL = """
+CREATE EXTERNAL TABLE {database}.{table_name} (
+  {columns_ddl}
+)
+ROW FORMAT SERDE 'org.apache.hadoop.hive.serde2.lazy.LazySimpleSerDe'
+WITH SERDEPROPERTIES (
+  'field.delim' = ',',
+  'skip.header.line.count' = '1'
+)
+STORED AS INPUTFORMAT 'org.apache.hadoop.mapred.TextInputFormat'
+OUTPUTFORMAT 'org.apache.hadoop.hive.ql.io.HiveIgnoreKeyTextOutputFormat'
+LOCATION '{s3_directory}'
+"""
+
+_PARQUET_TABLE_DDL = """
+CREATE EXTERNAL TABLE {database}.{table_name} (
+  {columns_ddl}
+)
+STORED AS PARQUET
+LOCATION '{s3_directory}'
+"""
+
 
 class AthenaService:
     """Serviço para integração com AWS Athena usando DuckDB"""
@@ -14,6 +179,7 @@ class AthenaService:
     def __init__(self):
         self.athena_client = None
         self.s3_client = None
+        self.glue_client = None
         self.result_bucket = None
         self.result_prefix = "athena-results/"
         self.conn = duckdb.connect(":memory:")
@@ -24,108 +190,142 @@ class AthenaService:
         try:
             if s3_config.is_configured():
                 credentials = s3_config.get_credentials()
-                
-                self.athena_client = boto3.client(
-                    'athena',
-                    aws_access_key_id=credentials['aws_access_key_id'],
-                    aws_secret_access_key=credentials['aws_secret_access_key'],
-                    region_name=credentials['region_name']
+                client_args = (
+                    credentials['aws_access_key_id'],
+                    credentials['aws_secret_access_key'],
+                    credentials['region_name']
                 )
                 
-                self.s3_client = boto3.client(
-                    's3',
-                    aws_access_key_id=credentials['aws_access_key_id'],
-                    aws_secret_access_key=credentials['aws_secret_access_key'],
-                    region_name=credentials['region_name']
-                )
+                self.athena_client = get_client('athena', *client_args)
+                self.s3_client = get_client('s3', *client_args)
+                self.glue_client = get_client('glue', *client_args)
                 
                 # Usar mesmo bucket para resultados
                 self.result_bucket = credentials['bucket_name']
                 
         except Exception as e:
-            print(f"Erro ao inicializar clientes Athena: {str(e)}")
+            logger.error("Erro ao inicializar clientes Athena: %s", e)
     
     def is_available(self) -> bool:
         """Verifica se o serviço está disponível"""
         return self.athena_client is not None and self.s3_client is not None
     
+    def invalidate_metadata_cache(self):
+        """Descarta databases, tabelas e schemas cacheados (ex.: após um DDL)"""
+        _cached_databases.clear()
+        _cached_tables.clear()
+        _cached_table_schema.clear()
+        _cached_table_exists.clear()
+    
     def get_databases(self) -> List[str]:
         """Lista databases disponíveis no Athena"""
         try:
             if not self.is_available():
                 return []
             
-            response = self.athena_client.list_databases(CatalogName='AwsDataCatalog')
-            databases = [db['Name'] for db in response['DatabaseList']]
-            return sorted(databases)
+            return _cached_databases(self, self.result_bucket)
             
         except Exception as e:
-            print(f"Erro ao listar databases: {str(e)}")
+            logger.warning("Erro ao listar databases: %s", e)
             return []
     
+    def _load_databases(self) -> List[str]:
+        """Consulta os databases no Glue Data Catalog (apenas nomes, paginado)"""
+        databases = []
+        paginator = self.glue_client.get_paginator('get_databases')
+        for page in paginator.paginate():
+            databases.extend(db['Name'] for db in page['DatabaseList'])
+        return sorted(databases)
+    
     def get_tables(self, database: str) -> List[str]:
         """Lista tabelas de um database específico"""
         try:
             if not self.is_available() or not database:
                 return []
             
-            response = self.athena_client.list_table_metadata(
-                CatalogName='AwsDataCatalog',
-                DatabaseName=database
-            )
-            
-            tables = [table['Name'] for table in response['TableMetadataList']]
-            return sorted(tables)
+            return _cached_tables(self, self.result_bucket, database)
             
         except Exception as e:
-            print(f"Erro ao listar tabelas: {str(e)}")
+            logger.warning("Erro ao listar tabelas: %s", e)
             return []
     
+    def _load_tables(self, database: str) -> List[str]:
+        """Consulta as tabelas do database no Glue Data Catalog (apenas nomes, paginado)"""
+        tables = []
+        paginator = self.glue_client.get_paginator('get_tables')
+        for page in paginator.paginate(DatabaseName=database):
+            tables.extend(table['Name'] for table in page['TableList'])
+        return sorted(tables)
+    
+    def table_exists(self, database: str, table: str) -> bool:
+        """Verifica se uma tabela existe (uma única consulta ao catálogo, sem listar o database)"""
+        try:
+            if not self.is_available() or not database or not table:
+                return False
+            
+            return _cached_table_exists(self, self.result_bucket, database, table)
+            
+        except Exception as e:
+            logger.warning("Erro ao verificar tabela: %s", e)
+            return False
+    
+    def _load_table_exists(self, database: str, table: str) -> bool:
+        """Consulta a tabela diretamente no Glue Data Catalog"""
+        try:
+            self.glue_client.get_table(DatabaseName=database, Name=table)
+            return True
+        except self.glue_client.exceptions.EntityNotFoundException:
+            return False
+    
     def get_table_schema(self, database: str, table: str) -> Optional[Dict]:
         """Obtém schema de uma tabela específica"""
         try:
             if not self.is_available() or not database or not table:
                 return None
             
-            response = self.athena_client.get_table_metadata(
-                CatalogName='AwsDataCatalog',
-                DatabaseName=database,
-                TableName=table
-            )
-            
-            table_metadata = response['TableMetadata']
-            
-            # Extrair informações do schema
-            columns = []
-            for column in table_metadata.get('Columns', []):
-                columns.append({
-                    'name': column['Name'],
-                    'type': column['Type'],
-                    'comment': column.get('Comment', '')
-                })
-            
-            schema_info = {
-                'database': database,
-                'table': table,
-                'columns': columns,
-                'location': table_metadata.get('Parameters', {}).get('location', ''),
-                'input_format': table_metadata.get('Parameters', {}).get('inputformat', ''),
-                'output_format': table_metadata.get('Parameters', {}).get('outputformat', ''),
-                'serialization_lib': table_metadata.get('Parameters', {}).get('serialization.lib', ''),
-                'partition_keys': [
-                    {'name': pk['Name'], 'type': pk['Type']} 
-                    for pk in table_metadata.get('PartitionKeys', [])
-                ],
-                'table_type': table_metadata.get('TableType', 'EXTERNAL_TABLE'),
-                'creation_time': table_metadata.get('CreateTime', datetime.now())
-            }
-            
-            return schema_info
+            return _cached_table_schema(self, self.result_bucket, database, table)
             
         except Exception as e:
-            print(f"Erro ao obter schema da tabela: {str(e)}")
+            logger.warning("Erro ao obter schema da tabela: %s", e)
             return None
     
+    def _load_table_schema(self, database: str, table: str) -> Dict:
+        """Consulta os metadados da tabela no Athena"""
+        response = self.athena_client.get_table_metadata(
+            CatalogName='AwsDataCatalog',
+            DatabaseName=database,
+            TableName=table
+        )
+        
+        table_metadata = response['TableMetadata']
+        
+        # Extrair informações do schema
+        columns = []
+        for column in table_metadata.get('Columns', []):
+            columns.append({
+                'name': column['Name'],
+                'type': column['Type'],
+                'comment': column.get('Comment', '')
+            })
+        
+        schema_info = {
+            'database': database,
+            'table': table,
+            'columns': columns,
+            'location': table_metadata.get('Parameters', {}).get('location', ''),
+            'input_format': table_metadata.get('Parameters', {}).get('inputformat', ''),
+            'output_format': table_metadata.get('Parameters', {}).get('outputformat', ''),
+            'serialization_lib': table_metadata.get('Parameters', {}).get('serialization.lib', ''),
+            'partition_keys': [
+                {'name': pk['Name'], 'type': pk['Type']} 
+                for pk in table_metadata.get('PartitionKeys', [])
+            ],
+            'table_type': table_metadata.get('TableType', 'EXTERNAL_TABLE'),
+            'creation_time': table_metadata.get('CreateTime', datetime.now())
+        }
+        
+        return schema_info
+    
     def execute_query(self, query: str, database: str = None) -> Tuple[bool, str, Optional[str]]:
         """
         Executa query no Athena
@@ -152,18 +352,27 @@ class AthenaService:
             response = self.athena_client.start_query_execution(**query_config)
             execution_id = response['QueryExecutionId']
             
-            # Aguardar conclusão
+            # Aguardar conclusão (a primeira verificação é imediata: queries curtas já terminaram)
+            delay = QUERY_POLL_INITIAL_DELAY
             while True:
                 response = self.athena_client.get_query_execution(QueryExecutionId=execution_id)
                 status = response['QueryExecution']['Status']['State']
                 
                 if status in ['SUCCEEDED']:
+                    if _DDL_RE.match(query) and not _ADD_PARTITION_RE.match(query):
+                        self.invalidate_metadata_cache()
                     return True, f"Query executada com sucesso. ID: {execution_id}", execution_id
                 elif status in ['FAILED', 'CANCELLED']:
                     error_message = response['QueryExecution']['Status'].get('StateChangeReason', 'Erro desconhecido')
+                    if database and 'data_changes_log' in query and (
+                        'TABLE_NOT_FOUND' in error_message or 'EntityNotFound' in error_message
+                    ):
+                        # A tabela de log confirmada antes não existe mais
+                        _confirmed_log_tables.discard((self.result_bucket, database))
                     return False, f"Query falhou: {error_message}", execution_id
                 
-                time.sleep(1)  # Aguardar 1 segundo antes de verificar novamente
+                time.sleep(delay)
+                delay = min(delay * QUERY_POLL_BACKOFF, QUERY_POLL_MAX_DELAY)
                 
         except Exception as e:
             return False, f"Erro ao executar query: {str(e)}", None
@@ -174,29 +383,59 @@ class AthenaService:
             if not self.is_available():
                 return None
             
-            response = self.athena_client.get_query_results(QueryExecutionId=execution_id)
-            
-            # Extrair dados
-            rows = response['ResultSet']['Rows']
-            if not rows:
-                return []
-            
-            # Primeira linha são os headers
-            headers = [col['VarCharValue'] for col in rows[0]['Data']]
+            # Percorrer todas as páginas (cada chamada retorna no máximo 1000 linhas)
+            paginator = self.athena_client.get_paginator('get_query_results')
+            pages = paginator.paginate(
+                QueryExecutionId=execution_id,
+                PaginationConfig={'PageSize': 1000}
+            )
             
-            # Dados das linhas
+            headers = None
             data = []
-            for row in rows[1:]:  # Pular header
-                row_data = {}
-                for i, col in enumerate(row['Data']):
-                    if i < len(headers):
-                        row_data[headers[i]] = col.get('VarCharValue', '')
-                data.append(row_data)
+            for page in pages:
+                # Resultado com mais de uma página: ler de uma vez o CSV que o Athena gravou no S3
+                if headers is None and page.get('NextToken'):
+                    csv_data = self._read_query_results_csv(execution_id)
+                    if csv_data is not None:
+                        return csv_data
+                
+                rows = page['ResultSet']['Rows']
+                
+                # Primeira linha da primeira página são os headers
+                if headers is None:
+                    if not rows:
+                        continue
+                    headers = [col['VarCharValue'] for col in rows[0]['Data']]
+                    rows = rows[1:]
+                
+                data.extend(
+                    dict(zip(headers, [col.get('VarCharValue', '') for col in row['Data']]))
+                    for row in rows
+                )
             
             return data
             
         except Exception as e:
-            print(f"Erro ao obter resultados: {str(e)}")
+            logger.warning("Erro ao obter resultados: %s", e)
+            return None
+    
+    def _read_query_results_csv(self, execution_id: str) -> Optional[List[Dict]]:
+        """Lê o CSV de resultado da query direto do S3 (None se não for possível)"""
+        try:
+            response = self.athena_client.get_query_execution(QueryExecutionId=execution_id)
+            output_location = response['QueryExecution']['ResultConfiguration']['OutputLocation']
+            if not output_location.endswith('.csv'):
+                return None
+            
+            bucket, key = output_location[len('s3://'):].split('/', 1)
+            body = self.s3_client.get_object(Bucket=bucket, Key=key)['Body'].read()
+            
+            # Tudo como texto e NULL como '', igual ao GetQueryResults
+            df = pd.read_csv(io.BytesIO(body), dtype=str, keep_default_na=False)
+            return df.to_dict('records')
+            
+        except Exception as e:
+            logger.warning("Erro ao ler resultado da query no S3: %s", e)
             return None
     
     def can_modify_table(self, schema_info: Dict) -> Tuple[bool, str]:
@@ -224,22 +463,8 @@ class AthenaService:
         input_format = schema_info.get('input_format', '').lower()
         serialization_lib = schema_info.get('serialization_lib', '').lower()
         
-        supported_formats = [
-            'textinputformat',
-            'org.apache.hadoop.mapred.textinputformat',
-            'parquet',
-            'org.apache.hadoop.hive.ql.io.parquet'
-        ]
-        
-        supported_serialization = [
-            'lazysimpleserdeutil',
-            'org.apache.hadoop.hive.serde2.lazy.lazysimpleserdeutil',
-            'parquet',
-            'org.apache.hadoop.hive.ql.io.parquet.serde.parquethiveserde'
-        ]
-        
-        format_supported = any(fmt in input_format for fmt in supported_formats)
-        serde_supported = any(serde in serialization_lib for serde in supported_serialization)
+        format_supported = _is_supported_class(input_format, SUPPORTED_INPUT_FORMATS)
+        serde_supported = _is_supported_class(serialization_lib, SUPPORTED_SERDES)
         
         if not (format_supported or serde_supported):
             return False, f"Formato não suportado: {input_format}, {serialization_lib}"
@@ -255,11 +480,11 @@ class AthenaService:
             if success and execution_id:
                 return self.get_query_results(execution_id)
             else:
-                print(f"Erro no preview: {message}")
+                logger.warning("Erro no preview: %s", message)
                 return None
                 
         except Exception as e:
-            print(f"Erro ao fazer preview: {str(e)}")
+            logger.warning("Erro ao fazer preview: %s", e)
             return None
     
     def create_changes_log_table(self, database: str, target_table: str = None) -> Tuple[bool, str]:
@@ -276,17 +501,26 @@ class AthenaService:
         try:
             table_name = "data_changes_log"
             
+            # Já confirmada antes: nenhuma consulta ao catálogo
+            if (self.result_bucket, database) in _confirmed_log_tables:
+                return True, f"Tabela de log {table_name} já existe"
+            
             # Verificar se tabela já existe
-            tables = self.get_tables(database)
-            if table_name in tables:
+            if self.table_exists(database, table_name):
+                # Tabelas em formato antigo (texto ou sem partições) não leem os arquivos atuais
+                if not self._is_current_log_table(database):
+                    return False, (
+                        f"Tabela de log {table_name} está em um formato antigo. "
+                        "Recrie a tabela de log para usar Parquet particionado"
+                    )
+                _confirmed_log_tables.add((self.result_bucket, database))
                 return True, f"Tabela de log {table_name} já existe"
             
-            # DDL para tabela de log com campos STRUCT para suportar múltiplas tabelas
+            # DDL para tabela de log com campos STRUCT para suportar múltiplas tabelas,
+            # particionada por database/tabela/dia para que cada consulta leia só as pastas necessárias
             ddl = f"""
 CREATE EXTERNAL TABLE {database}.{table_name} (
   `id` string,
-  `table_name` string,
-  `database_name` string,
   `operation` string,
   `row_identifier` string,
   `before` struct<
@@ -314,25 +548,23 @@ CREATE EXTERNAL TABLE {database}.{table_name} (
   `session_id` string,
   `change_reason` string
 )
-ROW FORMAT SERDE 'org.apache.hadoop.hive.serde2.lazy.LazySimpleSerDe'
-WITH SERDEPROPERTIES (
-  'field.delim' = '|',
-  'collection.delim' = ',',
-  'mapkey.delim' = ':',
-  'skip.header.line.count' = '1'
+PARTITIONED BY (
+  `database_name` string,
+  `table_name` string,
+  `ingest_date` string
 )
-STORED AS INPUTFORMAT 'org.apache.hadoop.mapred.TextInputFormat'
-OUTPUTFORMAT 'org.apache.hadoop.hive.ql.io.HiveIgnoreKeyTextOutputFormat'
-LOCATION 's3://{self.result_bucket}/data-changes-log/{database}/'
+STORED AS PARQUET
+LOCATION 's3://{self.result_bucket}/{_changes_log_prefix(database)}'
 TBLPROPERTIES (
   'has_encrypted_data'='false',
-  'classification'='csv'
+  'parquet.compression'='SNAPPY'
 )
 """
             
             success, message, execution_id = self.execute_query(ddl.strip(), database)
             
             if success:
+                _confirmed_log_tables.add((self.result_bucket, database))
                 return True, f"Tabela de log {table_name} criada com sucesso (schema STRUCT para múltiplas tabelas)"
             else:
                 return False, f"Erro ao criar tabela de log: {message}"
@@ -340,6 +572,19 @@ TBLPROPERTIES (
         except Exception as e:
             return False, f"Erro ao criar tabela de log: {str(e)}"
     
+    def _is_current_log_table(self, database: str) -> bool:
+        """Verifica se a tabela de log existente é Parquet particionada por database/tabela"""
+        schema_info = self.get_table_schema(database, "data_changes_log")
+        if not schema_info:
+            # Sem metadados não há como afirmar que é antiga
+            return True
+        
+        partition_keys = tuple(pk['name'] for pk in schema_info.get('partition_keys', []))
+        return (
+            'parquet' in schema_info.get('input_format', '').lower()
+            and partition_keys == CHANGES_LOG_PARTITION_KEYS
+        )
+    
     def save_table_changes(
         self,
         database: str,
@@ -395,87 +640,65 @@ TBLPROPERTIES (
         user_name: str
     ) -> List[Dict]:
         """Gera registros de log das alterações - apenas UPDATEs de dados existentes"""
-        import hashlib
-        import json
-        from datetime import datetime
-        import uuid
-        
         changes = []
         session_id = str(uuid.uuid4())[:8]
         timestamp = datetime.now().isoformat()
         
         # Identificar colunas chave
-        id_column = None
-        if original_data:
-            # Procurar por colunas que parecem ser IDs
-            for col in original_data[0].keys():
-                if any(keyword in col.lower() for keyword in ['id', 'key', 'pk']):
-                    id_column = col
-                    break
-            
-            # Se não encontrar, usar primeira coluna
-            if id_column is None:
-                id_column = list(original_data[0].keys())[0] if original_data[0] else None
+        id_column = _pick_id_column(tuple(original_data[0])) if original_data else None
         
         # Validar que temos a mesma quantidade de registros (apenas edição, não inserção/deleção)
         if len(original_data) != len(edited_data):
-            print(f"Aviso: Quantidade de registros diferente. Original: {len(original_data)}, Editado: {len(edited_data)}")
+            logger.warning(
+                "Quantidade de registros diferente. Original: %d, Editado: %d", len(original_data), len(edited_data)
+            )
             # Limitar ao menor tamanho para evitar INSERTs/DELETEs
             max_size = min(len(original_data), len(edited_data))
             original_data = original_data[:max_size]
             edited_data = edited_data[:max_size]
         
-        # Converter listas em dicionários indexados mantendo ordem original para comparação 1:1
-        original_dict = {}
-        for i, row in enumerate(original_data):
-            # Usar posição da lista para evitar problemas com IDs duplicados/ausentes
-            key = i
-            original_dict[str(key)] = row
+        # Comparar linha a linha (pela posição) de forma vetorizada: None vira string vazia
+        # e o restante é comparado como texto, só as linhas alteradas seguem para o log
+        original_frame = pd.DataFrame(original_data, dtype=object)
+        edited_frame = pd.DataFrame(edited_data, dtype=object)
+        original_frame, edited_frame = original_frame.align(edited_frame, join='outer', axis=1)
         
-        edited_dict = {}
-        for i, row in enumerate(edited_data):
-            # Usar posição da lista para garantir comparação correta linha por linha
-            key = i
-            edited_dict[str(key)] = row
+        original_text = original_frame.astype(str).where(original_frame.notna(), '').to_numpy()
+        edited_text = edited_frame.astype(str).where(edited_frame.notna(), '').to_numpy()
+        changed_positions = np.flatnonzero((original_text != edited_text).any(axis=1))
         
-        # Detectar apenas mudanças em registros existentes (UPDATEs)
-        for key in edited_dict:
-            if key in original_dict:
-                # Comparar linhas existentes
-                original_row = original_dict[key]
-                edited_row = edited_dict[key]
-                
-                # Normalizar dados para comparação (convertir None para string vazia, etc.)
-                def normalize_row(row):
-                    return {k: str(v) if v is not None else '' for k, v in row.items()}
-                
-                normalized_original = normalize_row(original_row)
-                normalized_edited = normalize_row(edited_row)
-                
-                # Verificar se houve mudança real nos dados
-                if normalized_original != normalized_edited:
-                    # Usar ID da linha se existir para identificação, senão usar posição
-                    row_id = edited_row.get(id_column, key) if id_column else key
-                    
-                    # Gerar ID único para a mudança
-                    change_id = hashlib.md5(
-                        f"{database}_{table_name}_{row_id}_{timestamp}".encode()
-                    ).hexdigest()
-                    
-                    change_record = {
-                        'id': change_id,
-                        'table_name': table_name,
-                        'database_name': database,
-                        'operation': 'UPDATE',
-                        'row_identifier': str(row_id),
-                        'before': json.dumps(original_row, default=str),
-                        'after': json.dumps(edited_row, default=str),
-                        'updated_by': user_name,
-                        'updated_at': timestamp,
-                        'session_id': session_id,
-                        'change_reason': 'Manual edit via Athena interface'
-                    }
-                    changes.append(change_record)
+        # Prefixo comum dos IDs de mudança hasheado uma vez; cada linha só acrescenta seu ID
+        base_digest = hashlib.blake2b(
+            f"{database}|{table_name}|{timestamp}|".encode(), digest_size=16
+        )
+        
+        for position in changed_positions.tolist():
+            original_row = original_data[position]
+            edited_row = edited_data[position]
+            
+            # Usar ID da linha se existir para identificação, senão usar posição
+            key = str(position)
+            row_id = edited_row.get(id_column, key) if id_column else key
+            
+            # Gerar ID único para a mudança
+            row_digest = base_digest.copy()
+            row_digest.update(str(row_id).encode())
+            change_id = row_digest.hexdigest()
+            
+            change_record = {
+                'id': change_id,
+                'table_name': table_name,
+                'database_name': database,
+                'operation': 'UPDATE',
+                'row_identifier': str(row_id),
+                'before': _to_log_struct(original_row),
+                'after': _to_log_struct(edited_row),
+                'updated_by': user_name,
+                'updated_at': timestamp,
+                'session_id': session_id,
+                'change_reason': 'Manual edit via Athena interface'
+            }
+            changes.append(change_record)
         
         # NÃO detectar INSERTs ou DELETEs - apenas UPDATEs de dados existentes
         # Isso evita logs de inserção desnecessários quando se está apenas editando dados
@@ -483,54 +706,66 @@ TBLPROPERTIES (
         return changes
     
     def _save_changes_to_s3(self, database: str, changes_data: List[Dict]) -> Tuple[bool, str]:
-        """Salva registros de mudanças no S3 em formato STRUCT"""
+        """Salva registros de mudanças no S3 em Parquet (Snappy), com before/after como STRUCT"""
         try:
-            from datetime import datetime
-            
             if not changes_data:
                 return False, "Nenhum dado de mudança para salvar"
             
-            # Definir colunas esperadas
-            columns = ['id', 'table_name', 'database_name', 'operation', 'row_identifier', 
-                      'before', 'after', 'updated_by', 'updated_at', 'session_id', 'change_reason']
-            
-            # Converter para CSV manualmente com formato STRUCT
-            csv_lines = []
-            csv_lines.append('|'.join(columns))  # Header
-            
+            # Montar as linhas no schema da tabela de log (STRUCT nativo, sem escapes)
+            rows = []
             for change_record in changes_data:
-                # Processar cada registro de mudança
-                escaped_row = []
-                for column in columns:
-                    value = change_record.get(column, '')
-                    
-                    # Campos STRUCT especiais (before e after)
+                row = {}
+                for column in CHANGES_LOG_SCHEMA.names:
+                    # Campos STRUCT (before e after) já vêm como dicionário
                     if column in ['before', 'after']:
-                        struct_value = self._convert_json_to_struct(str(value))
-                        escaped_row.append(struct_value)
+                        row[column] = change_record.get(column)
                     else:
-                        # Para outros campos, apenas escapar pipe
-                        escaped_value = str(value).replace('|', '\\|')
-                        escaped_row.append(escaped_value)
+                        row[column] = str(change_record.get(column, ''))
                 
-                csv_lines.append('|'.join(escaped_row))
-            
-            csv_content = '\n'.join(csv_lines)
-            
-            # Gerar nome do arquivo único
-            timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-            s3_key = f"data-changes-log/{database}/changes_{timestamp}.csv"
-            
-            # Upload para S3
-            credentials = s3_config.get_credentials()
-            self.s3_client.put_object(
-                Bucket=credentials['bucket_name'],
-                Key=s3_key,
-                Body=csv_content.encode('utf-8'),
-                ContentType='text/csv'
-            )
+                rows.append(row)
+            
+            # Um arquivo por partição (tabela alterada, no dia atual)
+            rows_by_table = {}
+            for row in rows:
+                rows_by_table.setdefault(row['table_name'], []).append(row)
+            
+            now = datetime.now()
+            timestamp = now.strftime("%Y%m%d_%H%M%S")
+            ingest_date = now.strftime("%Y-%m-%d")
+            saved_paths = []
+            
+            for table_name, table_rows in rows_by_table.items():
+                table = pa.Table.from_pylist(table_rows, schema=CHANGES_LOG_SCHEMA)
+                buffer = io.BytesIO()
+                pq.write_table(table, buffer, compression='snappy')
+                
+                # Gerar nome do arquivo único dentro da partição do dia
+                s3_key = (
+                    f"{_changes_log_prefix(database, table_name)}"
+                    f"ingest_date={ingest_date}/changes_{timestamp}.parquet"
+                )
+                
+                # Upload para S3
+                self.s3_client.put_object(
+                    Bucket=self.result_bucket,
+                    Key=s3_key,
+                    Body=buffer.getvalue(),
+                    ContentType='application/octet-stream'
+                )
+                
+                # Registrar a partição (DDL barato; não faz nada se já existir)
+                success, message, _ = self.execute_query(
+                    f"ALTER TABLE {database}.data_changes_log ADD IF NOT EXISTS "
+                    f"PARTITION (database_name = '{database}', table_name = '{table_name}', "
+                    f"ingest_date = '{ingest_date}')",
+                    database
+                )
+                if not success:
+                    return False, f"Log salvo, mas falhou ao registrar a partição: {message}"
+                
+                saved_paths.append(f"s3://{self.result_bucket}/{s3_key}")
             
-            return True, f"Log salvo em s3://{credentials['bucket_name']}/{s3_key}"
+            return True, f"Log salvo em {', '.join(saved_paths)}"
             
         except Exception as e:
             return False, f"Erro ao salvar no S3: {str(e)}"
@@ -548,45 +783,34 @@ TBLPROPERTIES (
             Lista de dicionários com alterações aplicadas OU dados originais se log não existir
         """
         try:
-            # Carregar dados originais da tabela
-            original_data = self.preview_table_data(database, table, limit)
-            if original_data is None:
-                return original_data
+            # Consultas ao catálogo usam o cache do Streamlit, que precisa do contexto da
+            # sessão: ficam nesta thread, e as threads auxiliares só fazem I/O na AWS
+            log_exists = (
+                (self.result_bucket, database) in _confirmed_log_tables
+                or self.table_exists(database, "data_changes_log")
+            )
+            read_from_s3 = log_exists and self._is_current_log_table(database)
+            
+            # Preview da tabela e leitura do log em paralelo: o log não depende do preview
+            with ThreadPoolExecutor(max_workers=2) as executor:
+                preview_future = executor.submit(self.preview_table_data, database, table, limit)
+                log_future = (
+                    executor.submit(self._fetch_log_rows, database, table, read_from_s3)
+                    if log_exists else None
+                )
+                original_data = preview_future.result()
+                log_data = log_future.result() if log_future else []
             
-            # Verificar se tabela de log existe E está funcionando
-            tables = self.get_tables(database)
-            if "data_changes_log" not in tables:
-                # Log não existe - retornar dados originais
+            if original_data is None or not log_data:
+                # Sem dados ou sem alterações no log - retornar dados originais
                 return original_data
             
-            # Tentar carregar alterações do log para esta tabela
             try:
-                log_query = f"""
-                SELECT * FROM {database}.data_changes_log 
-                WHERE table_name = '{table}' 
-                AND database_name = '{database}'
-                ORDER BY updated_at DESC
-                LIMIT 100
-                """
-                
-                log_success, log_message, log_execution_id = self.execute_query(log_query, database)
-                
-                if not log_success or not log_execution_id:
-                    # Erro ao executar query do log - retornar dados originais
-                    print(f"Erro ao consultar log, retornando dados originais: {log_message}")
-                    return original_data
-                
-                log_data = self.get_query_results(log_execution_id)
-                
-                if not log_data:
-                    # Sem alterações no log - retornar dados originais
-                    return original_data
-                
                 # Verificar se o log tem estrutura correta
                 required_columns = ['operation', 'row_identifier', 'before', 'after']
                 if not all(col in log_data[0] for col in required_columns):
                     # Log com estrutura incorreta - retornar dados originais
-                    print(f"Log com estrutura incorreta, retornando dados originais.")
+                    logger.warning("Log com estrutura incorreta, retornando dados originais")
                     return original_data
                 
                 # Aplicar alterações do log
@@ -595,86 +819,139 @@ TBLPROPERTIES (
                 
             except Exception as log_error:
                 # Qualquer erro com o log - retornar dados originais
-                print(f"Erro ao processar log, retornando dados originais: {str(log_error)}")
+                logger.warning("Erro ao processar log, retornando dados originais: %s", log_error)
                 return original_data
             
         except Exception as e:
-            print(f"Erro geral ao obter dados da tabela: {str(e)}")
+            logger.warning("Erro geral ao obter dados da tabela: %s", e)
+            return None
+    
+    def _fetch_log_rows(self, database: str, table: str, read_from_s3: bool) -> List[Dict]:
+        """Carrega as alterações do log (já confirmado) para uma tabela"""
+        try:
+            # Arquivos Parquet do log lidos direto do S3; o Athena fica como fallback
+            if read_from_s3:
+                log_data = self._load_log_rows_from_s3(database, table)
+                if log_data is not None:
+                    return log_data
+            
+            # STRUCTs retornados como JSON (o texto {k=v, ...} do Athena é ambíguo)
+            log_query = f"""
+            SELECT id, table_name, database_name, operation, row_identifier,
+                   json_format(CAST("before" AS JSON)) AS "before",
+                   json_format(CAST("after" AS JSON)) AS "after",
+                   updated_by, updated_at, session_id, change_reason
+            FROM {database}.data_changes_log 
+            WHERE table_name = '{table}' 
+            AND database_name = '{database}'
+            ORDER BY updated_at DESC
+            LIMIT {CHANGES_LOG_LIMIT}
+            """
+            
+            log_success, log_message, log_execution_id = self.execute_query(log_query, database)
+            
+            if not log_success or not log_execution_id:
+                # Erro ao executar query do log - seguir sem alterações
+                logger.warning("Erro ao consultar log, retornando dados originais: %s", log_message)
+                return []
+            
+            return self.get_query_results(log_execution_id) or []
+            
+        except Exception as e:
+            # Qualquer erro com o log - seguir sem alterações
+            logger.warning("Erro ao processar log, retornando dados originais: %s", e)
+            return []
+    
+    def _load_log_rows_from_s3(self, database: str, table: str) -> Optional[List[Dict]]:
+        """
+        Lê as alterações de uma tabela direto dos arquivos Parquet do log no S3
+        
+        Só as partições da tabela são listadas. Cada arquivo é baixado uma única vez (cache
+        por ETag); só os novos são buscados, em paralelo. Retorna None em caso de erro,
+        para que a consulta seja feita pelo Athena.
+        """
+        try:
+            log_files = []
+            paginator = self.s3_client.get_paginator('list_objects_v2')
+            pages = paginator.paginate(Bucket=self.result_bucket, Prefix=_changes_log_prefix(database, table))
+            for page in pages:
+                log_files.extend(obj for obj in page.get('Contents', []) if obj['Key'].endswith('.parquet'))
+            
+            with ThreadPoolExecutor(max_workers=LOG_FETCH_WORKERS) as executor:
+                files_rows = list(executor.map(
+                    lambda obj: _cached_log_file_rows(self.s3_client, self.result_bucket, obj['Key'], obj['ETag']),
+                    log_files
+                ))
+            
+            # Mesmo resultado da consulta ao Athena: filtro por tabela, mais recentes primeiro
+            log_rows = [
+                row
+                for rows in files_rows
+                for row in rows
+                if row['table_name'] == table and row['database_name'] == database
+            ]
+            log_rows.sort(key=lambda row: row['updated_at'] or '', reverse=True)
+            return log_rows[:CHANGES_LOG_LIMIT]
+            
+        except Exception as e:
+            logger.warning("Erro ao ler log direto do S3, usando Athena: %s", e)
             return None
     
     def _apply_changes_from_log(self, original_data: List[Dict], log_data: List[Dict]) -> List[Dict]:
         """Aplica alterações do log aos dados originais"""
-        # Criar cópia dos dados originais para modificar
-        result_data = [row.copy() for row in original_data]
-        
-        # Criar índice por ID para facilitar busca
-        id_column = None
-        if result_data:
-            # Procurar coluna ID
-            for col in result_data[0].keys():
-                if any(keyword in col.lower() for keyword in ['id', 'key', 'pk']):
-                    id_column = col
-                    break
-            if id_column is None:
-                id_column = list(result_data[0].keys())[0]
+        # Criar índice por ID para facilitar busca (as linhas originais só são copiadas
+        # quando alguma alteração do log é aplicada a elas)
+        id_column = _pick_id_column(tuple(original_data[0])) if original_data else None
+        if id_column:
+            result_dict = {str(row.get(id_column, i)): row for i, row in enumerate(original_data)}
+        else:
+            result_dict = {str(i): row for i, row in enumerate(original_data)}
         
-        # Criar dicionário indexado para busca rápida
-        result_dict = {}
-        for i, row in enumerate(result_data):
-            key = str(row.get(id_column, i)) if id_column else str(i)
-            result_dict[key] = row
-        
-        # Processar alterações em ordem cronológica reversa (mais recente primeiro)
+        # O log vem em ordem cronológica reversa (mais recente primeiro): só a alteração
+        # mais recente de cada linha importa, as anteriores nem precisam ser parseadas
+        latest_changes = {}
         for log_row in log_data:
+            operation = log_row.get('operation', '')
+            row_identifier = log_row.get('row_identifier', '')
+            
+            # Validar se campos obrigatórios existem
+            if not operation or not row_identifier:
+                continue
+            
+            latest_changes.setdefault(row_identifier, log_row)
+        
+        for row_identifier, log_row in latest_changes.items():
             try:
                 operation = log_row.get('operation', '')
-                row_identifier = log_row.get('row_identifier', '')
-                
-                # Validar se campos obrigatórios existem
-                if not operation or not row_identifier:
-                    continue
                 
                 if operation == 'UPDATE':
                     # Aplicar atualização
                     try:
-                        after_values_str = log_row.get('after', '')
-                        if not after_values_str or after_values_str.strip() == '':
-                            after_values_str = ''
-                        
-                        # Debug: verificar formato dos dados
-                        print(f"Processing UPDATE for row {row_identifier}: {after_values_str[:100]}...")
-                        
-                        # Converter STRUCT para dicionário
-                        after_values = self._convert_struct_to_dict(after_values_str)
+                        after_values = _from_log_struct(log_row.get('after'))
                         
                         # Filtrar apenas campos que existem na tabela original
                         if row_identifier in result_dict and after_values:
                             original_keys = set(result_dict[row_identifier].keys())
                             filtered_values = {k: v for k, v in after_values.items() if k in original_keys and v != ''}
                             
-                            print(f"Updating row {row_identifier} with: {filtered_values}")
-                            result_dict[row_identifier].update(filtered_values)
+                            logger.debug("Updating row %s with: %s", row_identifier, filtered_values)
+                            result_dict[row_identifier] = {**result_dict[row_identifier], **filtered_values}
                         
                     except Exception as e:
-                        print(f"Erro ao processar STRUCT em UPDATE: {str(e)}")
+                        logger.warning("Erro ao processar STRUCT em UPDATE: %s", e)
                         continue
                 
                 elif operation == 'INSERT':
                     # Adicionar nova linha
                     try:
-                        after_values_str = log_row.get('after', '')
-                        if not after_values_str or after_values_str.strip() == '':
-                            after_values_str = ''
-                        
-                        # Converter STRUCT para dicionário
-                        after_values = self._convert_struct_to_dict(after_values_str)
+                        after_values = _from_log_struct(log_row.get('after'))
                         
                         # Adicionar se não existe
                         if row_identifier not in result_dict and after_values:
                             result_dict[row_identifier] = after_values
                             
                     except Exception as e:
-                        print(f"Erro ao processar STRUCT em INSERT: {str(e)}")
+                        logger.warning("Erro ao processar STRUCT em INSERT: %s", e)
                         continue
                 
                 elif operation == 'DELETE':
@@ -683,45 +960,14 @@ TBLPROPERTIES (
                         del result_dict[row_identifier]
                 
             except Exception as e:
-                print(f"Erro ao aplicar alteração: {str(e)}")
+                logger.warning("Erro ao aplicar alteração: %s", e)
                 continue
         
         # Converter de volta para lista
         final_result = list(result_dict.values())
-        print(f"Final result has {len(final_result)} rows")
+        logger.debug("Final result has %d rows", len(final_result))
         return final_result
     
-    def _unescape_json_from_athena(self, json_str: str) -> str:
-        """Remove escape duplo de JSON lido do Athena (compatibilidade com dados antigos)"""
-        if not json_str or json_str in ['{}', '']:
-            return '{}'
-        
-        # Se tiver escape duplo ("""""), converter para escape simples ("")
-        if '""""' in json_str:
-            # Reverter o escape duplo que foi feito incorretamente
-            unescaped = json_str.replace('""""', '"')
-            return unescaped
-        
-        return json_str
-
-    def _escape_json_for_athena(self, json_str: str) -> str:
-        """Limpa e formata JSON para ser compatível com Athena LazySimpleSerDe"""
-        if not json_str or json_str in ['{}', '']:
-            return '{}'
-        
-        try:
-            # Parse e re-serialize para garantir JSON válido
-            data = json.loads(json_str)
-            
-            # Re-serializar sem escape adicional
-            clean_json = json.dumps(data, ensure_ascii=True, separators=(',', ':'))
-            
-            return clean_json
-            
-        except json.JSONDecodeError:
-            # Se não conseguir parsear, retornar JSON vazio
-            return '{}'
-
     def create_table_from_file(
         self, 
         database: str, 
@@ -741,52 +987,28 @@ TBLPROPERTIES (
             file_format: Formato do arquivo (csv, parquet)
         """
         try:
-            # Primeiro, tentar dropar a tabela se existir
-            drop_query = f"DROP TABLE IF EXISTS {database}.{table_name}"
-            drop_success, drop_message, drop_execution_id = self.execute_query(drop_query, database)
+            # Dropar só se a tabela existir: o Glue responde bem mais rápido que um DDL no Athena
+            try:
+                table_found = self._load_table_exists(database, table_name)
+            except Exception:
+                table_found = True
+            
+            if table_found:
+                drop_query = f"DROP TABLE IF EXISTS {database}.{table_name}"
+                drop_success, drop_message, drop_execution_id = self.execute_query(drop_query, database)
+            
+            # Colunas e diretório do S3 (sem o arquivo específico) valem para os dois formatos
+            columns_ddl = ",\n  ".join(f"`{col['name']}` {col['type']}" for col in columns)
+            s3_directory = os.path.dirname(s3_location) + '/'
             
             # Montar DDL baseado no formato
-            if file_format.lower() == 'csv':
-                # DDL para CSV com sintaxe correta do Athena
-                column_definitions = []
-                for col in columns:
-                    column_definitions.append(f"`{col['name']}` {col['type']}")
-                
-                columns_ddl = ",\n  ".join(column_definitions)
-                
-                # Extrair apenas o diretório do S3 (sem o arquivo específico)
-                import os
-                s3_directory = os.path.dirname(s3_location) + '/'
-                
-                ddl = f"""
-CREATE EXTERNAL TABLE {database}.{table_name} (
-  {columns_ddl}
-)
-ROW FORMAT SERDE 'org.apache.hadoop.hive.serde2.lazy.LazySimpleSerDe'
-WITH SERDEPROPERTIES (
-  'field.delim' = ',',
-  'skip.header.line.count' = '1'
-)
-STORED AS INPUTFORMAT 'org.apache.hadoop.mapred.TextInputFormat'
-OUTPUTFORMAT 'org.apache.hadoop.hive.ql.io.HiveIgnoreKeyTextOutputFormat'
-LOCATION '{s3_directory}'
-"""
-            else:
-                # DDL para Parquet
-                column_definitions = []
-                for col in columns:
-                    column_definitions.append(f"`{col['name']}` {col['type']}")
-                
-                columns_ddl = ",\n  ".join(column_definitions)
-                s3_directory = os.path.dirname(s3_location) + '/'
-                
-                ddl = f"""
-CREATE EXTERNAL TABLE {database}.{table_name} (
-  {columns_ddl}
-)
-STORED AS PARQUET
-LOCATION '{s3_directory}'
-"""
+            ddl_template = _CSV_TABLE_DDL if file_format.lower() == 'csv' else _PARQUET_TABLE_DDL
+            ddl = ddl_template.format(
+                database=database,
+                table_name=table_name,
+                columns_ddl=columns_ddl,
+                s3_directory=s3_directory
+            )
             
             success, message, execution_id = self.execute_query(ddl.strip(), database)
             
@@ -811,6 +1033,7 @@ LOCATION '{s3_directory}'
         """
         try:
             table_name = "data_changes_log"
+            _confirmed_log_tables.discard((self.result_bucket, database))
             
             # Primeiro dropar a tabela se existir
             drop_query = f"DROP TABLE IF EXISTS {database}.{table_name}"
@@ -819,27 +1042,12 @@ LOCATION '{s3_directory}'
             if not drop_success:
                 return False, f"Erro ao dropar tabela existente: {drop_message}"
             
-            # Limpar arquivos S3 antigos (opcional - pode falhar sem problemas)
-            try:
-                credentials = s3_config.get_credentials()
-                prefix = f"data-changes-log/{database}/"
-                
-                # Listar objetos para deletar
-                response = self.s3_client.list_objects_v2(
-                    Bucket=credentials['bucket_name'],
-                    Prefix=prefix
-                )
-                
-                if 'Contents' in response:
-                    objects_to_delete = [{'Key': obj['Key']} for obj in response['Contents']]
-                    if objects_to_delete:
-                        self.s3_client.delete_objects(
-                            Bucket=credentials['bucket_name'],
-                            Delete={'Objects': objects_to_delete}
-                        )
-                        
-            except Exception as cleanup_error:
-                print(f"Aviso: Erro ao limpar arquivos S3 antigos: {str(cleanup_error)}")
+            # Limpar arquivos S3 antigos em segundo plano (o CREATE não lê os dados). Só
+            # objetos anteriores ao DROP são removidos, preservando logs gravados depois
+            cleanup = _background_cleanup.submit(
+                self._cleanup_s3_prefix, _changes_log_prefix(database), datetime.now(timezone.utc)
+            )
+            cleanup.add_done_callback(_log_cleanup_error)
             
             # Recriar a tabela com estrutura correta
             create_success, create_message = self.create_changes_log_table(database, target_table)
@@ -852,215 +1060,59 @@ LOCATION '{s3_directory}'
         except Exception as e:
             return False, f"Erro ao recriar tabela de log: {str(e)}"
 
-    def _generate_struct_schema_from_table(self, database: str, table: str) -> str:
-        """
-        Gera schema STRUCT dinamicamente baseado nas colunas da tabela
+    def _cleanup_s3_prefix(self, prefix: str, modified_before: datetime) -> None:
+        """Remove os objetos de um prefixo do bucket do serviço anteriores a modified_before, página a página"""
+        paginator = self.s3_client.get_paginator('list_objects_v2')
+        pages = paginator.paginate(Bucket=self.result_bucket, Prefix=prefix)
         
-        Args:
-            database: Nome do database
-            table: Nome da tabela
-            
-        Returns:
-            String com schema STRUCT para usar no DDL
-        """
-        try:
-            # Obter schema da tabela
-            schema_info = self.get_table_schema(database, table)
-            if not schema_info:
-                # Fallback para estrutura genérica
-                return "struct<data:string>"
-            
-            # Construir campos do STRUCT baseado nas colunas da tabela
-            struct_fields = []
-            for col in schema_info.get('columns', []):
-                col_name = col['name']
-                col_type = col['type'].lower()
-                
-                # Mapear tipos do Athena para STRUCT
-                if 'int' in col_type or 'bigint' in col_type:
-                    struct_type = 'bigint'
-                elif 'double' in col_type or 'float' in col_type:
-                    struct_type = 'double'
-                elif 'boolean' in col_type:
-                    struct_type = 'boolean'
-                elif 'date' in col_type:
-                    struct_type = 'date'
-                elif 'timestamp' in col_type:
-                    struct_type = 'timestamp'
-                else:
-                    struct_type = 'string'
-                
-                struct_fields.append(f"{col_name}:{struct_type}")
-            
-            if struct_fields:
-                return f"struct<{','.join(struct_fields)}>"
-            else:
-                return "struct<data:string>"
-                
-        except Exception as e:
-            print(f"Erro ao gerar schema STRUCT: {str(e)}")
-            return "struct<data:string>"
+        # Cada página (até 1000 chaves) vira um delete_objects enquanto a listagem continua
+        with ThreadPoolExecutor(max_workers=LOG_DELETE_WORKERS) as executor:
+            deletions = []
+            for page in pages:
+                keys = [
+                    {'Key': obj['Key']} for obj in page.get('Contents', ())
+                    if obj['LastModified'] < modified_before
+                ]
+                if keys:
+                    deletions.append(executor.submit(
+                        self.s3_client.delete_objects,
+                        Bucket=self.result_bucket,
+                        Delete={'Objects': keys, 'Quiet': True}
+                    ))
+            for deletion in deletions:
+                deletion.result()
 
-    def _parse_struct_data(self, struct_str: str, schema_info: Dict) -> dict:
-        """
-        Parseia dados STRUCT do LazySimpleSerDe de volta para dicionário
-        
-        Args:
-            struct_str: String com dados STRUCT
-            schema_info: Informações do schema da tabela para mapear colunas
-            
-        Returns:
-            Dicionário com dados parseados
-        """
-        if not struct_str or struct_str.strip() == "":
-            return {}
-        
-        try:
-            # Obter nomes das colunas em ordem alfabética
-            columns = schema_info.get('columns', [])
-            sorted_column_names = sorted([col['name'] for col in columns])
-            
-            # Dividir valores (cuidado com escaping)
-            values = struct_str.split(',')
-            
-            # Mapear valores para colunas
-            result = {}
-            for i, col_name in enumerate(sorted_column_names):
-                if i < len(values):
-                    # Reverter escaping
-                    value = values[i].replace("\\|", "|").replace("\\,", ",")
-                    result[col_name] = value
-                else:
-                    result[col_name] = ""
-            
-            return result
-            
-        except Exception as e:
-            print(f"Erro ao parsear STRUCT: {str(e)}")
-            return {}
 
-    def _convert_json_to_struct(self, json_str: str) -> str:
-        """Converte JSON para formato STRUCT do Athena"""
-        if not json_str or json_str in ['{}', '']:
-            return ''  # STRUCT vazio sem vírgulas extras
-        
-        try:
-            # Parse JSON
-            data = json.loads(json_str)
-            
-            # Definir ordem dos campos do STRUCT
-            struct_fields = ['id', 'first_name', 'last_name', 'email', 'gender', 'ip_address', 'is_active', 'data']
-            
-            # Extrair valores na ordem correta, substituindo None/ausentes por string vazia
-            values = []
-            for field in struct_fields:
-                value = data.get(field, '')
-                # Escapar vírgulas no valor (delimitador de STRUCT)
-                escaped_value = str(value).replace(',', '\\,').replace('|', '\\|')
-                values.append(escaped_value)
-            
-            # Retornar valores separados por vírgula (formato STRUCT)
-            return ','.join(values)
-            
-        except json.JSONDecodeError:
-            # Se não conseguir parsear, retornar STRUCT vazio
-            return ''
-
-    def _convert_struct_to_dict(self, struct_str: str) -> dict:
-        """Converte string STRUCT de volta para dicionário"""
-        if not struct_str or struct_str.strip() in [',', '{}', '', 'null']:
-            return {}
-        
-        try:
-            # Limpar vírgulas no início/fim da string
-            cleaned_struct = struct_str.strip().strip(',').strip()
-            
-            # Verificar se é formato {key=value key2=value2} do Athena
-            if cleaned_struct.startswith('{') and cleaned_struct.endswith('}'):
-                return self._parse_athena_struct_format(cleaned_struct)
-            
-            # Formato original separado por vírgulas (fallback)
-            return self._parse_comma_separated_struct(cleaned_struct)
-            
-        except Exception as e:
-            print(f"Erro ao converter STRUCT: {str(e)}")
-            return {}
+@st.cache_data(ttl=METADATA_CACHE_TTL, show_spinner=False)
+def _cached_databases(_service: AthenaService, bucket_name: str) -> List[str]:
+    """Databases reaproveitados entre reruns"""
+    return _service._load_databases()
 
-    def _parse_athena_struct_format(self, struct_str: str) -> dict:
-        """Parse formato STRUCT do Athena: {key=value key2=value2}"""
-        # Remover chaves { }
-        content = struct_str.strip()[1:-1].strip()
-        
-        if not content:
-            return {}
-        
-        result = {}
-        
-        # Estratégia melhorada: usar regex para identificar padrões key=value
-        import re
-        
-        # Encontrar todas as chaves conhecidas seguidas de =
-        known_fields = ['id', 'first_name', 'last_name', 'email', 'gender', 'ip_address', 'is_active', 'data']
-        
-        # Criar padrão regex para capturar key=value
-        pattern = r'(\w+)=([^=]*?)(?=\s+\w+=|$)'
-        matches = re.findall(pattern, content)
-        
-        for key, value in matches:
-            # Limpar valor (remover espaços extras e vírgulas no início/fim)
-            cleaned_value = value.strip().strip(',').strip()
-            result[key] = cleaned_value
-        
-        # Garantir que todos os campos esperados existam
-        for field in known_fields:
-            if field not in result:
-                result[field] = ''
-        
-        return result
-
-    def _parse_comma_separated_struct(self, struct_str: str) -> dict:
-        """Parse formato STRUCT separado por vírgulas (formato antigo)"""
-        # Dividir valores (cuidado avec escaping)
-        values = []
-        current_value = ''
-        escaped = False
-        
-        for char in struct_str:
-            if escaped:
-                current_value += char
-                escaped = False
-            elif char == '\\':
-                escaped = True
-            elif char == ',':
-                values.append(current_value)
-                current_value = ''
-            else:
-                current_value += char
-        
-        # Adicionar último valor
-        if current_value:
-            values.append(current_value)
-        
-        # Mapear para campos conhecidos
-        struct_fields = ['id', 'first_name', 'last_name', 'email', 'gender', 'ip_address', 'is_active', 'data']
-        
-        result = {}
-        for i, field in enumerate(struct_fields):
-            if i < len(values):
-                # Reverter escaping
-                value = values[i].replace('\\,', ',').replace('\\|', '|')
-                result[field] = value if value else ''
-            else:
-                result[field] = ''
-        
-        return result
-
-    def debug_struct_conversion(self, struct_data: str) -> dict:
-        """Método de debug para conversão STRUCT"""
-        print(f"Input STRUCT: {struct_data}")
-        result = self._convert_struct_to_dict(struct_data)
-        print(f"Converted dict: {result}")
-        return result
+
+@st.cache_data(ttl=METADATA_CACHE_TTL, show_spinner=False)
+def _cached_tables(_service: AthenaService, bucket_name: str, database: str) -> List[str]:
+    """Tabelas de um database reaproveitadas entre reruns"""
+    return _service._load_tables(database)
+
+
+@st.cache_data(ttl=METADATA_CACHE_TTL, show_spinner=False)
+def _cached_table_schema(_service: AthenaService, bucket_name: str, database: str, table: str) -> Dict:
+    """Schema de uma tabela reaproveitado entre reruns"""
+    return _service._load_table_schema(database, table)
+
+
+@st.cache_data(ttl=METADATA_CACHE_TTL, show_spinner=False)
+def _cached_table_exists(_service: AthenaService, bucket_name: str, database: str, table: str) -> bool:
+    """Existência de uma tabela reaproveitada entre reruns"""
+    return _service._load_table_exists(database, table)
+
+
+# lru_cache (e não st.cache_data): chamado das threads de download, sem contexto do Streamlit
+@functools.lru_cache(maxsize=1000)
+def _cached_log_file_rows(s3_client, bucket_name: str, key: str, etag: str) -> List[Dict]:
+    """Baixa e decodifica um arquivo Parquet do log (imutável: a ETag identifica o conteúdo)"""
+    response = s3_client.get_object(Bucket=bucket_name, Key=key)
+    return pq.read_table(io.BytesIO(response['Body'].read())).to_pylist()
 
 
 # Função de conveniência
@@ -2,15 +2,45 @@
 Serviço de autenticação com AWS Cognito e fallback local
 """
 
-import boto3
+import functools
 import hashlib
 import hmac
 import base64
+import json
+import logging
 import os
 from typing import Optional, Dict, Tuple, Any
 from dataclasses import dataclass
 from enum import Enum
 import streamlit as st
+from app.config._env import load_env_once
+from app.config.aws_clients import get_client
+
+ENV = load_env_once()
+logger = logging.getLogger(__name__)
+
+
+@functools.lru_cache(maxsize=2048)
+def _secret_hash(username: str, client_id: bytes, client_secret: bytes) -> str:
+    """SECRET_HASH do Cognito (depende só do usuário e do app client)"""
+    secret_hash = hmac.new(
+        client_secret,
+        username.encode() + client_id,
+        hashlib.sha256
+    ).digest()
+    return base64.b64encode(secret_hash).decode('ascii')
+
+
+@st.cache_data(ttl=30, show_spinner=False)
+def _path_exists(path: str) -> bool:
+    """Existência de um arquivo local reaproveitada entre reruns"""
+    return os.path.exists(path)
+
+
+def _decode_jwt_claims(token: str) -> Dict[str, Any]:
+    """Lê as claims de um JWT sem validar a assinatura (token recebido direto do Cognito)"""
+    payload = token.split('.')[1]
+    return json.loads(base64.urlsafe_b64decode(payload + '=' * (-len(payload) % 4)))
 
 
 class AuthStatus(Enum):
@@ -50,14 +80,16 @@ class AuthenticationService:
     
     def __init__(self):
         # Configurações do Cognito
-        self.region = os.getenv('AWS_REGION', 'us-east-1')
-        self.user_pool_id = os.getenv('COGNITO_USER_POOL_ID')
-        self.client_id = os.getenv('COGNITO_CLIENT_ID')
-        self.client_secret = os.getenv('COGNITO_CLIENT_SECRET')
+        self.region = ENV.get('AWS_REGION', 'us-east-1')
+        self.user_pool_id = ENV.get('COGNITO_USER_POOL_ID')
+        self.client_id = ENV.get('COGNITO_CLIENT_ID')
+        self.client_secret = ENV.get('COGNITO_CLIENT_SECRET')
         
         # Usuário padrão local
-        self.default_username = os.getenv('DEFAULT_ADMIN_USER', 'admin')
-        self.default_password = os.getenv('DEFAULT_ADMIN_PASSWORD', 'admin')
+        self.default_username = ENV.get('DEFAULT_ADMIN_USER', 'admin')
+        self.default_password = ENV.get('DEFAULT_ADMIN_PASSWORD', 'admin')
+        self._default_username_bytes = self.default_username.encode()
+        self._default_password_bytes = self.default_password.encode()
         
         # Cliente Cognito
         self.cognito_client = None
@@ -65,16 +97,20 @@ class AuthenticationService:
     
     def _initialize_cognito(self):
         """Inicializa cliente Cognito se configurado"""
+        # Credenciais do app client já codificadas para o SECRET_HASH
+        self._client_id_bytes = (self.client_id or '').encode()
+        self._client_secret_bytes = (self.client_secret or '').encode()
+        
         try:
             if self.user_pool_id and self.client_id:
-                self.cognito_client = boto3.client(
+                self.cognito_client = get_client(
                     'cognito-idp',
-                    region_name=self.region,
-                    aws_access_key_id=os.getenv('AWS_ACCESS_KEY_ID'),
-                    aws_secret_access_key=os.getenv('AWS_SECRET_ACCESS_KEY')
+                    ENV.get('AWS_ACCESS_KEY_ID'),
+                    ENV.get('AWS_SECRET_ACCESS_KEY'),
+                    self.region
                 )
         except Exception as e:
-            print(f"Erro ao inicializar Cognito: {str(e)}")
+            logger.error("Erro ao inicializar Cognito: %s", e)
             self.cognito_client = None
     
     def is_cognito_available(self) -> bool:
@@ -86,13 +122,7 @@ class AuthenticationService:
         if not self.client_secret:
             return ""
         
-        message = username + self.client_id
-        secret_hash = hmac.new(
-            self.client_secret.encode(),
-            message.encode(),
-            hashlib.sha256
-        ).digest()
-        return base64.b64encode(secret_hash).decode()
+        return _secret_hash(username, self._client_id_bytes, self._client_secret_bytes)
     
     def _authenticate_cognito(self, username: str, password: str) -> AuthResult:
         """Autentica via AWS Cognito"""
@@ -113,26 +143,20 @@ class AuthenticationService:
                 AuthParameters=auth_params
             )
             
-            # Extrair token
+            # Extrair tokens
             access_token = response['AuthenticationResult']['AccessToken']
             
-            # Obter informações do usuário
-            user_info = self.cognito_client.admin_get_user(
-                UserPoolId=self.user_pool_id,
-                Username=username
-            )
-            
-            # Extrair atributos do usuário
-            user_attributes = {attr['Name']: attr['Value'] for attr in user_info.get('UserAttributes', [])}
-            user_groups = [group['GroupName'] for group in user_info.get('Groups', [])]
+            # Atributos e grupos já vêm no IdToken: sem chamada extra ao Cognito
+            claims = _decode_jwt_claims(response['AuthenticationResult']['IdToken'])
+            user_groups = claims.get('cognito:groups', [])
             
             # Verificar se é admin
             is_admin = 'admin' in [group.lower() for group in user_groups]
             
             user = AuthUser(
                 username=username,
-                email=user_attributes.get('email'),
-                full_name=user_attributes.get('name', username),
+                email=claims.get('email'),
+                full_name=claims.get('name', username),
                 groups=user_groups,
                 is_admin=is_admin,
                 auth_method="cognito"
@@ -163,7 +187,11 @@ class AuthenticationService:
     
     def _authenticate_local(self, username: str, password: str) -> AuthResult:
         """Autentica via usuário local padrão"""
-        if username == self.default_username and password == self.default_password:
+        # Comparação em tempo constante; '&' avalia as duas mesmo se o usuário já não bate
+        valid = hmac.compare_digest(username.encode(), self._default_username_bytes) & hmac.compare_digest(
+            password.encode(), self._default_password_bytes
+        )
+        if valid:
             user = AuthUser(
                 username=username,
                 email=f"{username}@local.system",
@@ -215,7 +243,7 @@ class AuthenticationService:
                 self.cognito_client.global_sign_out(AccessToken=access_token)
             return True
         except Exception as e:
-            print(f"Erro no logout: {str(e)}")
+            logger.warning("Erro no logout: %s", e)
             return False
     
     def get_user_info(self, access_token: str) -> Optional[AuthUser]:
@@ -248,7 +276,7 @@ class AuthenticationService:
             return None
             
         except Exception as e:
-            print(f"Erro ao obter informações do usuário: {str(e)}")
+            logger.warning("Erro ao obter informações do usuário: %s", e)
             return None
     
     def is_user_admin(self, user: AuthUser) -> bool:
@@ -259,8 +287,8 @@ class AuthenticationService:
         """Retorna caminho da imagem de fundo baseado no usuário"""
         if self.is_user_admin(user):
             # Admin pode ter imagem personalizada
-            custom_path = os.getenv('ADMIN_BACKGROUND_IMAGE', 'assets/admin_background.jpg')
-            if os.path.exists(custom_path):
+            custom_path = ENV.get('ADMIN_BACKGROUND_IMAGE', 'assets/admin_background.jpg')
+            if _path_exists(custom_path):
                 return custom_path
         
         # Imagem padrão
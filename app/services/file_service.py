@@ -1,17 +1,270 @@
 import streamlit as st
 import duckdb
-from typing import Dict, List, Any, Tuple, Optional
+import pyarrow as pa
+from typing import Dict, List, Any, Iterator, Tuple, Optional
 from io import BytesIO
+import contextlib
+import functools
+import hashlib
 import re
 import unicodedata
 import os
+import shutil
+import sys
+import tempfile
+import threading
+import uuid
+
+try:
+    import xxhash
+except ImportError:
+    # xxhash não instalado, usar blake2b da biblioteca padrão
+    xxhash = None
+
+try:
+    import fsspec
+except ImportError:
+    # fsspec não instalado, DuckDB lê os CSVs de arquivos temporários
+    fsspec = None
+
+
+def read_excel_sheet(file_obj, sheet_name: Optional[str] = None, header_row: int = 0, limit: Optional[int] = None) -> Tuple[List[str], List[tuple], int]:
+    """
+    Lê uma aba Excel direto do buffer em memória, em modo streaming
+    
+    Args:
+        file_obj: Arquivo (UploadedFile ou buffer binário)
+        sheet_name: Nome da aba (None usa a aba ativa)
+        header_row: Linha do cabeçalho (0-indexada)
+        limit: Máximo de linhas de dados retornadas (None retorna todas)
+        
+    Returns:
+        tuple: (colunas, linhas, total_de_linhas)
+    """
+    from openpyxl import load_workbook
+    
+    file_obj.seek(0)
+    workbook = load_workbook(file_obj, read_only=True, data_only=True)
+    try:
+        worksheet = workbook[sheet_name] if sheet_name else workbook.active
+        row_iter = worksheet.iter_rows(min_row=header_row + 1, values_only=True)
+        
+        header = next(row_iter, None) or ()
+        columns = [
+            str(value) if value is not None else f"column{i}"
+            for i, value in enumerate(header)
+        ]
+        
+        rows = []
+        total_rows = 0
+        for values in row_iter:
+            # Ignorar linhas completamente vazias (comuns no fim das abas)
+            if all(value is None for value in values):
+                continue
+            total_rows += 1
+            if limit is None or len(rows) < limit:
+                rows.append(tuple(values[:len(columns)]) + (None,) * (len(columns) - len(values)))
+        
+        return columns, rows, total_rows
+    finally:
+        workbook.close()
+        file_obj.seek(0)
+
+
+# Tamanho dos blocos copiados ao gravar uploads em arquivo temporário
+SPILL_CHUNK_BYTES = 1024 * 1024
+
+
+def spill_to_tmp(uploaded_file) -> str:
+    """
+    Grava o arquivo enviado em um arquivo temporário único, em blocos
+    
+    Evita a cópia completa dos bytes feita por getvalue(). Quem chama remove o arquivo.
+    
+    Returns:
+        str: Caminho do arquivo temporário
+    """
+    path = os.path.join(tempfile.gettempdir(), f"{uuid.uuid4().hex}_{os.path.basename(uploaded_file.name)}")
+    uploaded_file.seek(0)
+    with open(path, "wb", buffering=SPILL_CHUNK_BYTES) as f:
+        shutil.copyfileobj(uploaded_file, f, SPILL_CHUNK_BYTES)
+    uploaded_file.seek(0)
+    return path
+
+
+# Conexão DuckDB do serviço: leitura de CSV em paralelo em todos os núcleos, com teto de
+# memória por conexão. A ordem de inserção é mantida (o preview mostra as primeiras linhas)
+DUCKDB_CONFIG = {
+    'threads': os.cpu_count() or 1,
+    'memory_limit': '2GB',
+}
+
+# Separadores candidatos na detecção automática e tamanho da amostra analisada
+CSV_SEPARATORS = (b',', b';', b'\t', b'|')
+SEPARATOR_SAMPLE_BYTES = 4 * 1024
+
+@contextlib.contextmanager
+def spilled_to_tmp(uploaded_file) -> Iterator[str]:
+    """Arquivo temporário com o conteúdo do upload, removido ao sair do bloco (mesmo com erro)"""
+    path = spill_to_tmp(uploaded_file)
+    try:
+        yield path
+    finally:
+        if os.path.exists(path):
+            os.remove(path)
+
+
+# Bytes lidos do início do CSV para estimar o total de linhas no preview
+ROW_ESTIMATE_SAMPLE_BYTES = 64 * 1024
+
+# Tipos já detectados pelo sniffer do DuckDB; VARCHAR e outros seguem para a inferência em Python
+_DUCKDB_TYPE_TO_DTYPE = {
+    'tinyint': 'int64', 'smallint': 'int64', 'integer': 'int64', 'bigint': 'int64', 'hugeint': 'int64',
+    'utinyint': 'int64', 'usmallint': 'int64', 'uinteger': 'int64', 'ubigint': 'int64',
+    'float': 'float64', 'double': 'float64', 'decimal': 'float64',
+    'boolean': 'bool',
+    'date': 'datetime64', 'timestamp': 'datetime64', 'timestamp with time zone': 'datetime64',
+}
+
+
+# Regexes de normalização de nomes de colunas (compiladas uma única vez)
+_NON_WORD_RE = re.compile(r'\W')
+_SEPARATOR_RUN_RE = re.compile(r'(?:\W|_)+')
+
+# Regexes de inferência de tipos das colunas no preview
+_INT_RE = re.compile(r'^-?\d+$')
+_FLOAT_RE = re.compile(r'^-?\d*\.?\d+([eE][+-]?\d+)?$')
+_DATE_RE = re.compile(
+    r'\d{4}-\d{2}-\d{2}'    # YYYY-MM-DD
+    r'|\d{2}/\d{2}/\d{4}'   # DD/MM/YYYY
+    r'|\d{2}-\d{2}-\d{4}'   # DD-MM-YYYY
+)
+# Valores aceitos como booleanos na inferência de tipos (comparados em minúsculas)
+_BOOL_VOCAB = frozenset({'true', 'false', '1', '0', 'yes', 'no', 'sim', 'não', 'verdadeiro', 'falso'})
+
+
+# Acentos comuns do português/espanhol removidos com uma única passada de str.translate
+_ACCENT_TABLE = str.maketrans(
+    'áàâãäéèêëíìîïóòôõöúùûüçñÁÀÂÃÄÉÈÊËÍÌÎÏÓÒÔÕÖÚÙÛÜÇÑ',
+    'aaaaaeeeeiiiiooooouuuucnAAAAAEEEEIIIIOOOOOUUUUCN'
+)
+
+
+
+@functools.lru_cache(maxsize=1)
+def _strip_marks_table() -> Dict[int, None]:
+    """Tabela de str.translate com todas as marcas combinantes (categoria Mn), montada no primeiro uso"""
+    return dict.fromkeys(
+        code for code in range(sys.maxunicode + 1)
+        if unicodedata.category(chr(code)) == 'Mn'
+    )
+
+
+def _remove_accents(text: str) -> str:
+    """Remove acentos de um texto"""
+    text = text.translate(_ACCENT_TABLE)
+    if text.isascii():
+        return text
+    
+    # Outros caracteres acentuados: decomposição Unicode e remoção das marcas combinantes
+    return unicodedata.normalize('NFD', text).translate(_strip_marks_table())
+
+
+@functools.lru_cache(maxsize=4096)
+def _normalize_column_name(column_name: str, normalization_rules: Tuple[Tuple[str, str], ...]) -> str:
+    """Normaliza um nome de coluna (memoizado, já que os nomes se repetem entre uploads)"""
+    # Converter para minúsculas
+    normalized = column_name.lower().strip()
+    
+    # Aplicar regras específicas
+    for original, replacement in normalization_rules:
+        if original in normalized:
+            normalized = normalized.replace(original, replacement)
+    
+    # Remover acentos
+    normalized = _remove_accents(normalized)
+    
+    # Substituir sequências de caracteres especiais/underscores por um único underscore
+    normalized = _SEPARATOR_RUN_RE.sub('_', normalized)
+    
+    # Limpar início e fim
+    normalized = normalized.strip('_')
+    
+    # Garantir que não comece com número
+    if normalized and normalized[0].isdigit():
+        normalized = 'col_' + normalized
+    
+    # Garantir que não seja vazio
+    if not normalized:
+        normalized = 'unnamed_column'
+    
+    return normalized
+
+
+def _relation_to_arrow(relation) -> pa.Table:
+    """Materializa uma relação DuckDB como tabela Arrow (versões novas devolvem um reader)"""
+    result = relation.arrow()
+    if isinstance(result, pa.RecordBatchReader):
+        return result.read_all()
+    return result
+
+
+def _dedupe_names(names: List[str]) -> List[str]:
+    """Renomeia nomes repetidos com sufixos _1, _2, ... (conjunto + próximo sufixo por nome, O(n))"""
+    used = set()
+    next_suffix = {}
+    result = []
+    for name in names:
+        candidate = name
+        if candidate in used:
+            counter = next_suffix.get(name, 1)
+            candidate = f"{name}_{counter}"
+            while candidate in used:
+                counter += 1
+                candidate = f"{name}_{counter}"
+            next_suffix[name] = counter + 1
+        used.add(candidate)
+        result.append(candidate)
+    return result
+
+
+def file_content_key(uploaded_file) -> str:
+    """
+    Gera a chave de cache do conteúdo do arquivo sem copiar os bytes
+    
+    Usa xxhash quando instalado e, caso contrário, blake2b da biblioteca padrão.
+    """
+    with uploaded_file.getbuffer() as buffer:
+        if xxhash is not None:
+            return xxhash.xxh3_128_hexdigest(buffer)
+        return hashlib.blake2b(buffer, digest_size=16).hexdigest()
+
+
+@st.cache_data(show_spinner=False)
+def _cached_excel_sheets(_service, _uploaded_file, file_key: str) -> List[str]:
+    """Abas da planilha, calculadas uma única vez por conteúdo de arquivo"""
+    return _service._get_excel_sheets(_uploaded_file)
+
+
+@st.cache_data(show_spinner=False)
+def _cached_preview(_service, _uploaded_file, file_key: str, file_name: str, sep: str, header_row: int, sheet_name: Optional[str]) -> Tuple[Any, Dict]:
+    """Preview do arquivo, recalculado apenas quando arquivo ou configurações mudam"""
+    return _service._preview_file(_uploaded_file, sep, header_row, sheet_name)
+
+
+@st.cache_resource(show_spinner=False, max_entries=4)
+def _cached_file_data(_service, _uploaded_file, file_key: str, file_name: str, sep: str, header_row: int, sheet_name: Optional[str]) -> List[Dict]:
+    """Todas as linhas do arquivo; cache_resource devolve a mesma lista sem copiá-la a cada rerun"""
+    data, _ = _service._preview_file(_uploaded_file, sep, header_row, sheet_name, full_data=True)
+    return data
 
 
 class FileProcessingService:
     """Serviço para processamento de arquivos CSV/Excel usando DuckDB"""
     
     def __init__(self):
-        self.conn = duckdb.connect(":memory:")
+        self.conn = duckdb.connect(":memory:", config=DUCKDB_CONFIG)
+        self._conn_lock = threading.Lock()
         self.supported_formats = ['csv', 'xlsx', 'xls']
         self.normalization_rules = {
             'tipo (r$)': 'tipo_rs',
@@ -23,42 +276,24 @@ class FileProcessingService:
             'custo (r$)': 'custo_rs',
             'custo(r$)': 'custo_rs',
         }
+        self._rules_key = tuple(self.normalization_rules.items())
     
     def get_excel_sheets(self, uploaded_file) -> List[str]:
-        """Retorna lista de abas de uma planilha Excel"""
+        """Retorna lista de abas de uma planilha Excel (cacheado por conteúdo)"""
+        return _cached_excel_sheets(self, uploaded_file, file_content_key(uploaded_file))
+    
+    def _get_excel_sheets(self, uploaded_file) -> List[str]:
+        """Detecta as abas de uma planilha Excel (só os metadados do workbook são lidos)"""
+        from openpyxl import load_workbook
+        
         try:
-            # Salvar arquivo temporariamente para DuckDB
-            temp_path = f"/tmp/temp_excel_{uploaded_file.name}"
-            with open(temp_path, "wb") as f:
-                f.write(uploaded_file.getvalue())
-            
-            # Usar DuckDB para ler metadados do Excel
+            uploaded_file.seek(0)
+            workbook = load_workbook(uploaded_file, read_only=True)
             try:
-                # Tentar diferentes abas para detectar quais existem
-                sheets = []
-                for i in range(10):  # Tentar até 10 abas
-                    try:
-                        result = self.conn.execute(f"SELECT * FROM read_excel('{temp_path}', sheet={i}) LIMIT 1").fetchall()
-                        sheets.append(f"Sheet{i+1}")
-                    except:
-                        break
-                
-                # Se não encontrou nenhuma aba, tentar com nomes padrão
-                if not sheets:
-                    common_names = ['Sheet1', 'Planilha1', 'Plan1', 'Data', 'Dados']
-                    for name in common_names:
-                        try:
-                            result = self.conn.execute(f"SELECT * FROM read_excel('{temp_path}', sheet='{name}') LIMIT 1").fetchall()
-                            sheets.append(name)
-                            break
-                        except:
-                            continue
-                
-                return sheets if sheets else ['Sheet1']
-                
-            except Exception as e:
-                # Fallback: retornar nome padrão
-                return ['Sheet1']
+                return workbook.sheetnames or ['Sheet1']
+            finally:
+                workbook.close()
+                uploaded_file.seek(0)
                 
         except Exception as e:
             st.error(f"Erro ao ler planilha Excel: {e}")
@@ -66,76 +301,93 @@ class FileProcessingService:
     
     def preview_file(self, uploaded_file, sep: str = ",", header_row: int = 0, sheet_name: str = None) -> Tuple[Any, Dict]:
         """
-        Faz preview de arquivo CSV ou Excel usando DuckDB
+        Faz preview de arquivo CSV ou Excel usando DuckDB (cacheado por conteúdo)
         
         Returns:
             tuple: (dataframe_dict, file_info)
         """
+        return _cached_preview(
+            self, uploaded_file, file_content_key(uploaded_file), uploaded_file.name,
+            sep, header_row, sheet_name
+        )
+    
+    def load_file_data(self, uploaded_file, sep: str = ",", header_row: int = 0, sheet_name: str = None) -> List[Dict]:
+        """
+        Lê todas as linhas do arquivo uma única vez, para validação e upload
+        
+        A lista é compartilhada entre reruns e não deve ser alterada por quem a recebe.
+        
+        Returns:
+            List[Dict]: Linhas do arquivo
+        """
+        return _cached_file_data(
+            self, uploaded_file, file_content_key(uploaded_file), uploaded_file.name,
+            sep, header_row, sheet_name
+        )
+    
+    def _preview_file(self, uploaded_file, sep: str = ",", header_row: int = 0, sheet_name: str = None, full_data: bool = False) -> Tuple[Any, Dict]:
+        """Faz preview de arquivo CSV ou Excel usando DuckDB"""
         file_extension = uploaded_file.name.split('.')[-1].lower()
+        limit = None if full_data else 50
         
         try:
             if file_extension == 'csv':
-                return self._preview_csv_with_duckdb(uploaded_file, sep, header_row)
+                return self._preview_csv_with_duckdb(uploaded_file, sep, header_row, limit)
             elif file_extension in ['xlsx', 'xls']:
-                return self._preview_excel_with_duckdb(uploaded_file, sheet_name, header_row)
+                return self._preview_excel_with_openpyxl(uploaded_file, sheet_name, header_row, limit)
             else:
                 raise ValueError(f"Formato de arquivo não suportado: {file_extension}")
                 
         except Exception as e:
             raise Exception(f"Erro ao fazer preview do arquivo: {str(e)}")
     
-    def _preview_csv_with_duckdb(self, uploaded_file, sep: str, header_row: int):
+    def _preview_csv_with_duckdb(self, uploaded_file, sep: str, header_row: int, limit: Optional[int] = 50):
         """Preview CSV usando DuckDB e retorna lista de dicionários"""
         try:
             # Detectar separador se for "auto"
             if sep == "auto":
                 sep = self._detect_csv_separator(uploaded_file)
             
-            # Salvar arquivo temporariamente
-            temp_path = f"/tmp/temp_{uploaded_file.name}"
-            with open(temp_path, "wb") as f:
-                f.write(uploaded_file.getvalue())
+            # Com fsspec o DuckDB lê direto do buffer em memória; sem ele, de um arquivo temporário
+            if fsspec is not None:
+                csv_source = contextlib.nullcontext(uploaded_file)
+            else:
+                csv_source = spilled_to_tmp(uploaded_file)
             
             # Ler com DuckDB
             skip_rows = header_row if header_row > 0 else 0
+            # A instância do serviço é compartilhada entre sessões: uma leitura por vez na conexão
+            with csv_source as source, self._conn_lock:
+                uploaded_file.seek(0)
+                relation = self.conn.read_csv(source, sep=sep, header=True, skiprows=skip_rows)
+                # Tipos do sniffer, obtidos na mesma leitura da amostra
+                sniffed_types = [_DUCKDB_TYPE_TO_DTYPE.get(t.id) for t in relation.types]
+                if limit:
+                    relation = relation.limit(limit)
+                
+                # Resultado em Arrow (colunar); dicionários só na saída
+                table = _relation_to_arrow(relation)
+            uploaded_file.seek(0)
             
-            result = self.conn.execute(f"""
-                SELECT * FROM read_csv('{temp_path}', 
-                                     delim='{sep}', 
-                                     header=true,
-                                     skip={skip_rows})
-                LIMIT 50
-            """).fetchall()
-            
-            # Obter nomes das colunas
-            columns = [desc[0] for desc in self.conn.description]
-            
-            # Converter para lista de dicionários
-            data = []
-            for row in result:
-                row_dict = dict(zip(columns, row))
-                data.append(row_dict)
-            
-            # Query para contagem total de linhas
-            count_result = self.conn.execute(f"""
-                SELECT COUNT(*) FROM read_csv('{temp_path}', 
-                                            delim='{sep}', 
-                                            header=true,
-                                            skip={skip_rows})
-            """).fetchall()
-            
-            total_rows = count_result[0][0] if count_result else len(data)
+            columns = table.column_names
+            data = table.to_pylist()
             
-            # Limpar arquivo temporário
-            if os.path.exists(temp_path):
-                os.remove(temp_path)
+            # Total estimado pelo tamanho médio das linhas (sem uma segunda leitura do arquivo)
+            if limit and len(data) == limit:
+                total_rows = max(self._estimate_csv_rows(uploaded_file, skip_rows), len(data))
+            else:
+                total_rows = len(data)
             
             # Obter tipos das colunas
             column_types = {}
             if data:
-                for column in columns:
-                    # Inferir tipo baseado nos primeiros valores não-nulos
-                    sample_values = [row[column] for row in data[:10] if row.get(column) is not None]
+                sample = table.slice(0, 10)
+                for column, sniffed in zip(columns, sniffed_types):
+                    if sniffed:
+                        column_types[column] = sniffed
+                        continue
+                    # Texto: inferir tipo baseado nos primeiros valores não-nulos (ex.: "1,5", "sim")
+                    sample_values = sample.column(column).drop_null().to_pylist()
                     if sample_values:
                         column_types[column] = self._infer_column_type(sample_values)
                     else:
@@ -155,63 +407,17 @@ class FileProcessingService:
             st.error(f"Erro ao processar CSV: {e}")
             return [], {'formato': 'csv', 'erro': str(e)}
     
-    def _preview_excel_with_duckdb(self, uploaded_file, sheet_name: str, header_row: int):
-        """Preview Excel usando DuckDB e retorna lista de dicionários"""
+    def _preview_excel_with_openpyxl(self, uploaded_file, sheet_name: str, header_row: int, limit: Optional[int] = 50):
+        """Preview Excel via leitura streaming do openpyxl e retorna lista de dicionários"""
         try:
-            # Salvar arquivo temporariamente
-            temp_path = f"/tmp/temp_{uploaded_file.name}"
-            with open(temp_path, "wb") as f:
-                f.write(uploaded_file.getvalue())
-            
-            # Construir query DuckDB para Excel
-            skip_rows = header_row if header_row > 0 else 0
-            
-            if sheet_name:
-                result = self.conn.execute(f"""
-                    SELECT * FROM read_excel('{temp_path}', 
-                                           sheet='{sheet_name}',
-                                           header=true,
-                                           skip={skip_rows})
-                    LIMIT 50
-                """).fetchall()
-                
-                # Query para contagem total
-                count_result = self.conn.execute(f"""
-                    SELECT COUNT(*) FROM read_excel('{temp_path}', 
-                                                  sheet='{sheet_name}',
-                                                  header=true,
-                                                  skip={skip_rows})
-                """).fetchall()
-            else:
-                result = self.conn.execute(f"""
-                    SELECT * FROM read_excel('{temp_path}', 
-                                           header=true,
-                                           skip={skip_rows})
-                    LIMIT 50
-                """).fetchall()
-                
-                # Query para contagem total
-                count_result = self.conn.execute(f"""
-                    SELECT COUNT(*) FROM read_excel('{temp_path}', 
-                                                  header=true,
-                                                  skip={skip_rows})
-                """).fetchall()
-            
-            # Obter nomes das colunas
-            columns = [desc[0] for desc in self.conn.description]
+            columns, rows, total_rows = read_excel_sheet(uploaded_file, sheet_name, header_row, limit=limit)
             
             # Converter para lista de dicionários
             data = []
-            for row in result:
+            for row in rows:
                 row_dict = dict(zip(columns, row))
                 data.append(row_dict)
             
-            total_rows = count_result[0][0] if count_result else len(data)
-            
-            # Limpar arquivo temporário
-            if os.path.exists(temp_path):
-                os.remove(temp_path)
-            
             # Obter tipos das colunas
             column_types = {}
             if data:
@@ -237,22 +443,35 @@ class FileProcessingService:
             st.error(f"Erro ao processar Excel: {e}")
             return [], {'formato': 'excel', 'erro': str(e)}
     
+    def _estimate_csv_rows(self, uploaded_file, skip_rows: int) -> int:
+        """Estima as linhas de dados do CSV a partir de uma amostra do início do arquivo"""
+        uploaded_file.seek(0)
+        sample = uploaded_file.read(ROW_ESTIMATE_SAMPLE_BYTES)
+        uploaded_file.seek(0)
+        
+        # Linhas da amostra (a última pode não terminar em quebra de linha)
+        sample_lines = sample.count(b'\n') + (0 if sample.endswith(b'\n') else 1)
+        if len(sample) < ROW_ESTIMATE_SAMPLE_BYTES:
+            # Arquivo inteiro na amostra: contagem direta
+            total_lines = sample_lines
+        else:
+            total_lines = round(uploaded_file.size / (len(sample) / max(sample_lines, 1)))
+        
+        # Descontar linhas puladas e cabeçalho
+        return max(total_lines - skip_rows - 1, 0)
+    
     def _detect_csv_separator(self, uploaded_file) -> str:
         """Detecta automaticamente o separador do CSV"""
-        # Ler primeiras linhas para detectar separador
-        sample = uploaded_file.read(1024).decode('utf-8', errors='ignore')
+        # Ler primeiras linhas para detectar separador (os separadores são ASCII: contar nos bytes)
+        uploaded_file.seek(0)
+        sample = uploaded_file.read(SEPARATOR_SAMPLE_BYTES)
         uploaded_file.seek(0)  # Reset file pointer
         
-        separators = [',', ';', '\t', '|']
-        separator_counts = {}
+        separator_counts = {sep: sample.count(sep) for sep in CSV_SEPARATORS}
+        best_sep = max(separator_counts, key=separator_counts.get)
         
-        for sep in separators:
-            count = sample.count(sep)
-            if count > 0:
-                separator_counts[sep] = count
-        
-        if separator_counts:
-            return max(separator_counts, key=separator_counts.get)
+        if separator_counts[best_sep] > 0:
+            return best_sep.decode()
         else:
             return ','  # Default
     
@@ -280,16 +499,19 @@ class FileProcessingService:
             # Remover acentos e caracteres especiais
             normalized = col.lower()
             normalized = normalized.replace(' ', '_')
-            normalized = ''.join(c if c.isalnum() or c == '_' else '' for c in normalized)
+            normalized = _NON_WORD_RE.sub('', normalized)
             normalized_mapping[col] = normalized
         
-        # Aplicar normalização
+        # Aplicar normalização: linhas com as mesmas colunas, na mesma ordem, são reconstruídas
+        # por posição (sem buscar cada coluna por nome)
+        original_keys = tuple(original_columns)
+        new_keys = tuple(normalized_mapping[col] for col in original_columns)
         normalized_data = []
         for row in data_dict:
-            normalized_row = {}
-            for old_col, new_col in normalized_mapping.items():
-                normalized_row[new_col] = row.get(old_col)
-            normalized_data.append(normalized_row)
+            if tuple(row) == original_keys:
+                normalized_data.append(dict(zip(new_keys, row.values())))
+            else:
+                normalized_data.append({new_col: row.get(old_col) for old_col, new_col in normalized_mapping.items()})
         
         return normalized_data
     
@@ -307,21 +529,9 @@ class FileProcessingService:
             raise ValueError("Input deve ser uma lista de dicionários")
         
         df_normalized = df.copy()
-        normalized_columns = []
-        
-        for original_col in df.columns:
-            normalized_col = self._normalize_single_column(original_col)
-            
-            # Evitar duplicatas
-            counter = 1
-            base_normalized = normalized_col
-            while normalized_col in normalized_columns:
-                normalized_col = f"{base_normalized}_{counter}"
-                counter += 1
-            
-            normalized_columns.append(normalized_col)
         
-        df_normalized.columns = normalized_columns
+        # Evitar duplicatas
+        df_normalized.columns = _dedupe_names([self._normalize_single_column(col) for col in df.columns])
         return df_normalized
     
     def _normalize_single_column(self, column_name):
@@ -329,42 +539,7 @@ class FileProcessingService:
         if not isinstance(column_name, str):
             column_name = str(column_name)
         
-        # Converter para minúsculas
-        normalized = column_name.lower().strip()
-        
-        # Aplicar regras específicas
-        for original, replacement in self.normalization_rules.items():
-            if original in normalized:
-                normalized = normalized.replace(original, replacement)
-        
-        # Remover acentos
-        normalized = self._remove_accents(normalized)
-        
-        # Substituir caracteres especiais por underscore
-        normalized = re.sub(r'[^\w]', '_', normalized)
-        
-        # Remover underscores múltiplos
-        normalized = re.sub(r'_+', '_', normalized)
-        
-        # Limpar início e fim
-        normalized = normalized.strip('_')
-        
-        # Garantir que não comece com número
-        if normalized and normalized[0].isdigit():
-            normalized = 'col_' + normalized
-        
-        # Garantir que não seja vazio
-        if not normalized:
-            normalized = 'unnamed_column'
-        
-        return normalized
-    
-    def _remove_accents(self, text):
-        """Remove acentos de um texto"""
-        return ''.join(
-            char for char in unicodedata.normalize('NFD', text)
-            if unicodedata.category(char) != 'Mn'
-        )
+        return _normalize_column_name(column_name, self._rules_key)
     
     def get_column_mapping_preview(self, columns):
         """
@@ -376,27 +551,14 @@ class FileProcessingService:
         Returns:
             dict: Mapeamento {original: normalizado}
         """
-        preview = {}
-        normalized_columns = []
-        
-        for col in columns:
-            normalized = self._normalize_single_column(col)
-            
-            # Verificar duplicatas
-            counter = 1
-            base_normalized = normalized
-            while normalized in normalized_columns:
-                normalized = f"{base_normalized}_{counter}"
-                counter += 1
-            
-            preview[col] = normalized
-            normalized_columns.append(normalized)
-        
-        return preview
+        # Verificar duplicatas
+        normalized_columns = _dedupe_names([self._normalize_single_column(col) for col in columns])
+        return dict(zip(columns, normalized_columns))
     
     def add_normalization_rule(self, original, replacement):
         """Adiciona regra customizada de normalização"""
         self.normalization_rules[original.lower()] = replacement.lower()
+        self._rules_key = tuple(self.normalization_rules.items())
     
     def get_file_info(self, uploaded_file):
         """Retorna informações básicas sobre o arquivo"""
@@ -429,77 +591,49 @@ class FileProcessingService:
     
     def _infer_column_type(self, sample_values):
         """Infere o tipo de dados de uma coluna baseado em valores de amostra"""
-        import re
-        
         if not sample_values:
             return 'object'
         
-        # Converter todos para string para análise
-        str_values = [str(v) for v in sample_values if v is not None]
+        # Converter todos para string (sem espaços nas pontas) para análise
+        str_values = [str(v).strip() for v in sample_values if v is not None]
         
         if not str_values:
             return 'object'
         
-        # Verificar se todos são números inteiros
-        all_int = True
-        for val in str_values:
-            if not re.match(r'^-?\d+$', val.strip()):
-                all_int = False
-                break
-        
-        if all_int:
+        # Verificar se todos são números inteiros (map percorre em C e para no primeiro que falha)
+        if all(map(_INT_RE.match, str_values)):
             return 'int64'
         
         # Verificar se todos são números decimais
-        all_float = True
-        for val in str_values:
-            if not re.match(r'^-?\d*\.?\d+([eE][+-]?\d+)?$', val.strip().replace(',', '.')):
-                all_float = False
-                break
-        
-        if all_float:
+        if all(map(_FLOAT_RE.match, [val.replace(',', '.') for val in str_values])):
             return 'float64'
         
         # Verificar se são booleanos
-        bool_values = {'true', 'false', '1', '0', 'yes', 'no', 'sim', 'não', 'verdadeiro', 'falso'}
-        all_bool = True
-        for val in str_values:
-            if val.strip().lower() not in bool_values:
-                all_bool = False
-                break
-        
-        if all_bool:
+        if all(val.lower() in _BOOL_VOCAB for val in str_values):
             return 'bool'
         
         # Verificar se são datas
-        date_patterns = [
-            r'\d{4}-\d{2}-\d{2}',  # YYYY-MM-DD
-            r'\d{2}/\d{2}/\d{4}',  # DD/MM/YYYY
-            r'\d{2}-\d{2}-\d{4}',  # DD-MM-YYYY
-        ]
-        
-        all_date = True
-        for val in str_values:
-            is_date = any(re.match(pattern, val.strip()) for pattern in date_patterns)
-            if not is_date:
-                all_date = False
-                break
-        
-        if all_date:
+        if all(map(_DATE_RE.match, str_values)):
             return 'datetime64'
         
         # Default para string
         return 'object'
 
 
+@st.cache_resource
+def get_file_service() -> FileProcessingService:
+    """Retorna instância do serviço de arquivos compartilhada entre reruns"""
+    return FileProcessingService()
+
+
 # Funções de conveniência para compatibilidade
 def preview_file(uploaded_file, sep=',', header_row=0, sheet_name=None):
     """Função wrapper para compatibilidade"""
-    service = FileProcessingService()
+    service = get_file_service()
     return service.preview_file(uploaded_file, sep, header_row, sheet_name)
 
 
 def get_excel_sheets(uploaded_file):
     """Função wrapper para compatibilidade"""
-    service = FileProcessingService()
+    service = get_file_service()
     return service.get_excel_sheets(uploaded_file) 
\ No newline at end of file
@@ -1,9 +1,20 @@
-import boto3
 import duckdb
+import logging
+import pyarrow as pa
+import streamlit as st
+import threading
 from datetime import datetime
 from botocore.exceptions import ClientError, NoCredentialsError
+from concurrent.futures import ThreadPoolExecutor
 from typing import Dict, List, Any
 
+from app.config.aws_clients import get_client
+
+logger = logging.getLogger(__name__)
+
+# Máximo de chamadas HeadObject simultâneas ao montar o histórico
+HEAD_OBJECT_WORKERS = 32
+
 class S3HistoryManager:
     """Gerencia o histórico de uploads no S3 usando DuckDB"""
     
@@ -14,20 +25,17 @@ class S3HistoryManager:
         self.region_name = region_name
         self.s3_client = None
         self.conn = duckdb.connect(":memory:")
+        # A instância é compartilhada entre sessões: uma consulta por vez na conexão
+        self._conn_lock = threading.Lock()
         
         try:
-            self.s3_client = boto3.client(
-                's3',
-                aws_access_key_id=aws_access_key,
-                aws_secret_access_key=aws_secret_key,
-                region_name=region_name
-            )
+            self.s3_client = get_client('s3', aws_access_key, aws_secret_key, region_name)
         except Exception as e:
-            print(f"Erro ao conectar com S3: {str(e)}")
+            logger.error("Erro ao conectar com S3: %s", e)
     
     def get_upload_history(self, prefix="uploads/", limit=50) -> List[Dict]:
         """
-        Recupera o histórico de uploads usando DuckDB
+        Recupera o histórico de uploads usando DuckDB (cacheado por 30 segundos)
         
         Args:
             prefix (str): Prefixo para filtrar arquivos
@@ -36,66 +44,86 @@ class S3HistoryManager:
         Returns:
             List[Dict]: Lista de dicionários com histórico de uploads
         """
+        return _cached_upload_history(self, self.bucket_name, prefix, limit)
+    
+    def invalidate_cache(self):
+        """Descarta o histórico cacheado (ex.: após um novo upload)"""
+        _cached_upload_history.clear()
+    
+    def _list_recent_objects(self, prefix: str, limit: int) -> List[Dict]:
+        """Lista todos os objetos do prefixo de forma paginada e retorna os mais recentes"""
+        paginator = self.s3_client.get_paginator('list_objects_v2')
+        
+        objects = []
+        for page in paginator.paginate(
+            Bucket=self.bucket_name,
+            Prefix=prefix,
+            PaginationConfig={'PageSize': 1000}
+        ):
+            objects.extend(page.get('Contents', []))
+        
+        objects.sort(key=lambda obj: obj['LastModified'], reverse=True)
+        return objects[:limit]
+    
+    def _build_file_info(self, obj: Dict) -> Dict:
+        """Monta as informações de um arquivo, buscando a metadata via HeadObject"""
+        try:
+            # Buscar metadata
+            head_response = self.s3_client.head_object(
+                Bucket=self.bucket_name,
+                Key=obj['Key']
+            )
+            metadata = head_response.get('Metadata', {})
+            
+            return {
+                'file_key': obj['Key'],
+                'filename': obj['Key'].split('/')[-1],
+                'original_filename': metadata.get('original_filename', 'N/A'),
+                'upload_date': obj['LastModified'].isoformat(),
+                'file_size_bytes': obj['Size'],
+                'file_size_mb': round(obj['Size'] / (1024 * 1024), 2),
+                'schema_used': metadata.get('schema_used', 'N/A'),
+                'row_count': int(metadata.get('row_count', 0)) if metadata.get('row_count', '0').isdigit() else 0,
+                'column_count': int(metadata.get('column_count', 0)) if metadata.get('column_count', '0').isdigit() else 0,
+                'upload_timestamp': metadata.get('upload_timestamp', obj['LastModified'].isoformat())
+            }
+            
+        except Exception as e:
+            # Se der erro ao buscar metadata, ainda inclui informações básicas
+            return {
+                'file_key': obj['Key'],
+                'filename': obj['Key'].split('/')[-1],
+                'original_filename': 'N/A',
+                'upload_date': obj['LastModified'].isoformat(),
+                'file_size_bytes': obj['Size'],
+                'file_size_mb': round(obj['Size'] / (1024 * 1024), 2),
+                'schema_used': 'N/A',
+                'row_count': 0,
+                'column_count': 0,
+                'upload_timestamp': obj['LastModified'].isoformat()
+            }
+    
+    def _load_upload_history(self, prefix: str, limit: int) -> List[Dict]:
+        """Carrega o histórico direto do S3 (sem cache)"""
         try:
             if self.s3_client is None:
                 return []
             
-            # Listar objetos no S3
-            response = self.s3_client.list_objects_v2(
-                Bucket=self.bucket_name,
-                Prefix=prefix,
-                MaxKeys=limit
-            )
+            # Listar objetos no S3 (paginado) e manter apenas os mais recentes
+            objects = self._list_recent_objects(prefix, limit)
             
-            if 'Contents' not in response:
+            if not objects:
                 return []
             
-            # Coletar dados dos arquivos
-            files_data = []
-            for obj in response['Contents']:
-                try:
-                    # Buscar metadata
-                    head_response = self.s3_client.head_object(
-                        Bucket=self.bucket_name,
-                        Key=obj['Key']
-                    )
-                    metadata = head_response.get('Metadata', {})
-                    
-                    file_info = {
-                        'file_key': obj['Key'],
-                        'filename': obj['Key'].split('/')[-1],
-                        'original_filename': metadata.get('original_filename', 'N/A'),
-                        'upload_date': obj['LastModified'].isoformat(),
-                        'file_size_bytes': obj['Size'],
-                        'file_size_mb': round(obj['Size'] / (1024 * 1024), 2),
-                        'schema_used': metadata.get('schema_used', 'N/A'),
-                        'row_count': int(metadata.get('row_count', 0)) if metadata.get('row_count', '0').isdigit() else 0,
-                        'column_count': int(metadata.get('column_count', 0)) if metadata.get('column_count', '0').isdigit() else 0,
-                        'upload_timestamp': metadata.get('upload_timestamp', obj['LastModified'].isoformat())
-                    }
-                    files_data.append(file_info)
-                    
-                except Exception as e:
-                    # Se der erro ao buscar metadata, ainda inclui informações básicas
-                    file_info = {
-                        'file_key': obj['Key'],
-                        'filename': obj['Key'].split('/')[-1],
-                        'original_filename': 'N/A',
-                        'upload_date': obj['LastModified'].isoformat(),
-                        'file_size_bytes': obj['Size'],
-                        'file_size_mb': round(obj['Size'] / (1024 * 1024), 2),
-                        'schema_used': 'N/A',
-                        'row_count': 0,
-                        'column_count': 0,
-                        'upload_timestamp': obj['LastModified'].isoformat()
-                    }
-                    files_data.append(file_info)
+            # Coletar metadata dos arquivos com HeadObject em paralelo
+            with ThreadPoolExecutor(max_workers=min(HEAD_OBJECT_WORKERS, len(objects))) as executor:
+                files_data = list(executor.map(self._build_file_info, objects))
             
             if not files_data:
                 return []
             
             # Usar DuckDB para processar os dados
-            self.conn.register('files_temp', files_data)
+            files_table = pa.Table.from_pylist(files_data)
             
             # Query SQL para processar e ordenar os dados
             query = """
@@ -113,7 +141,9 @@ class S3HistoryManager:
             LIMIT ?
             """
             
-            result = self.conn.execute(query, [limit]).fetchall()
+            with self._conn_lock:
+                self.conn.register('files_temp', files_table)
+                result = self.conn.execute(query, [limit]).fetchall()
             
             # Converter resultado para lista de dicionários
             columns = ['filename', 'original_filename', 'upload_date', 'file_size_mb', 
@@ -127,7 +157,7 @@ class S3HistoryManager:
             return result_list
             
         except Exception as e:
-            print(f"Erro ao recuperar histórico: {str(e)}")
+            logger.error("Erro ao recuperar histórico: %s", e)
             return []
     
     def get_upload_statistics(self) -> Dict[str, Any]:
@@ -151,10 +181,7 @@ class S3HistoryManager:
                     'schemas_used': []
                 }
             
-            # Usar DuckDB para calcular estatísticas
-            self.conn.register('history', history_list)
-            
-            # Estatísticas gerais
+            # Usar DuckDB para calcular estatísticas (consulta de estatísticas gerais)
             stats_query = """
             SELECT 
                 COUNT(*) as total_files,
@@ -164,8 +191,6 @@ class S3HistoryManager:
             FROM history
             """
             
-            stats_result = self.conn.execute(stats_query).fetchone()
-            
             # Schemas mais usados
             schemas_query = """
             SELECT 
@@ -178,7 +203,10 @@ class S3HistoryManager:
             LIMIT 5
             """
             
-            schemas_result = self.conn.execute(schemas_query).fetchall()
+            with self._conn_lock:
+                self.conn.register('history', history_list)
+                stats_result = self.conn.execute(stats_query).fetchone()
+                schemas_result = self.conn.execute(schemas_query).fetchall()
             
             statistics = {
                 'total_files': int(stats_result[0]) if stats_result[0] else 0,
@@ -192,7 +220,7 @@ class S3HistoryManager:
             return statistics
             
         except Exception as e:
-            print(f"Erro ao calcular estatísticas: {str(e)}")
+            logger.error("Erro ao calcular estatísticas: %s", e)
             return {
                 'total_files': 0,
                 'total_size_mb': 0,
@@ -218,8 +246,6 @@ class S3HistoryManager:
             if not history_list:
                 return []
             
-            self.conn.register('history', history_list)
-            
             # Query para agrupar por data
             query = """
             SELECT 
@@ -232,7 +258,9 @@ class S3HistoryManager:
             ORDER BY upload_day DESC
             """
             
-            result = self.conn.execute(query, [days]).fetchall()
+            with self._conn_lock:
+                self.conn.register('history', history_list)
+                result = self.conn.execute(query, [days]).fetchall()
             
             return [
                 {
@@ -244,7 +272,7 @@ class S3HistoryManager:
             ]
             
         except Exception as e:
-            print(f"Erro ao obter uploads por data: {str(e)}")
+            logger.error("Erro ao obter uploads por data: %s", e)
             return []
     
     def search_files(self, search_term: str, limit=20) -> List[Dict]:
@@ -264,8 +292,6 @@ class S3HistoryManager:
             if not history_list:
                 return []
             
-            self.conn.register('history', history_list)
-            
             # Query de busca
             query = """
             SELECT 
@@ -285,14 +311,16 @@ class S3HistoryManager:
             """
             
             search_pattern = f"%{search_term}%"
-            result = self.conn.execute(query, [search_pattern, search_pattern, search_pattern, limit]).fetchall()
+            with self._conn_lock:
+                self.conn.register('history', history_list)
+                result = self.conn.execute(query, [search_pattern, search_pattern, search_pattern, limit]).fetchall()
             
             columns = ['filename', 'original_filename', 'upload_date', 'file_size_mb', 'schema_used', 'file_key']
             
             return [dict(zip(columns, row)) for row in result]
             
         except Exception as e:
-            print(f"Erro ao buscar arquivos: {str(e)}")
+            logger.error("Erro ao buscar arquivos: %s", e)
             return []
     
     def test_connection(self) -> tuple:
@@ -319,4 +347,16 @@ class S3HistoryManager:
             else:
                 return False, f"Erro AWS: {e.response['Error']['Message']}"
         except Exception as e:
-            return False, f"Erro de conexão: {str(e)}" 
\ No newline at end of file
+            return False, f"Erro de conexão: {str(e)}"
+
+
+@st.cache_data(ttl=30, show_spinner=False)
+def _cached_upload_history(_manager: S3HistoryManager, bucket_name: str, prefix: str, limit: int) -> List[Dict]:
+    """Histórico de uploads reaproveitado entre reruns por até 30 segundos"""
+    return _manager._load_upload_history(prefix, limit)
+
+
+@st.cache_resource
+def get_history_manager(aws_access_key, aws_secret_key, bucket_name, region_name='us-east-1') -> S3HistoryManager:
+    """Retorna instância do gerenciador de histórico compartilhada entre reruns"""
+    return S3HistoryManager(aws_access_key, aws_secret_key, bucket_name, region_name)
@@ -1,12 +1,23 @@
 import streamlit as st
 import duckdb
-import boto3
 from typing import Tuple, Optional, Dict, Any, List
 from datetime import datetime
-import os
+import csv
 import io
+import threading
+from boto3.s3.transfer import TransferConfig
 from botocore.exceptions import ClientError, NoCredentialsError
+from app.config.aws_clients import get_client
 from app.config.s3_config import s3_config
+from app.services.file_service import read_excel_sheet, spilled_to_tmp
+
+
+# Uploads acima de 8MB são enviados em partes, com até 10 partes simultâneas
+UPLOAD_TRANSFER_CONFIG = TransferConfig(
+    multipart_threshold=8 * 1024 * 1024,
+    max_concurrency=10,
+    use_threads=True
+)
 
 
 class S3UploaderService:
@@ -14,6 +25,8 @@ class S3UploaderService:
     
     def __init__(self):
         self.conn = duckdb.connect(":memory:")
+        # A instância é compartilhada entre sessões: uma consulta por vez na conexão
+        self._conn_lock = threading.Lock()
         self.s3_client = None
         self._initialize_s3_client()
     
@@ -22,11 +35,11 @@ class S3UploaderService:
         try:
             if s3_config.is_configured():
                 credentials = s3_config.get_credentials()
-                self.s3_client = boto3.client(
+                self.s3_client = get_client(
                     's3',
-                    aws_access_key_id=credentials['aws_access_key_id'],
-                    aws_secret_access_key=credentials['aws_secret_access_key'],
-                    region_name=credentials['region_name']
+                    credentials['aws_access_key_id'],
+                    credentials['aws_secret_access_key'],
+                    credentials['region_name']
                 )
         except Exception as e:
             st.error(f"Erro ao inicializar cliente S3: {e}")
@@ -35,7 +48,7 @@ class S3UploaderService:
         """Verifica se o serviço S3 está disponível"""
         return self.s3_client is not None and s3_config.is_configured()
     
-    def upload_file(self, uploaded_file, schema: Dict, subject: str, sub_subject: str) -> Tuple[bool, str]:
+    def upload_file(self, uploaded_file, schema: Dict, subject: str, sub_subject: str, data: Optional[List[Dict]] = None) -> Tuple[bool, str]:
         """
         Faz upload de arquivo para S3 após processamento com DuckDB
         
@@ -44,6 +57,7 @@ class S3UploaderService:
             schema: Schema YAML de validação
             subject: Assunto do arquivo
             sub_subject: Sub-assunto do arquivo
+            data: Dados já lidos do arquivo (evita uma segunda leitura)
             
         Returns:
             tuple: (sucesso, mensagem)
@@ -53,7 +67,8 @@ class S3UploaderService:
         
         try:
             # Converter arquivo para lista de dicionários usando DuckDB
-            data = self._load_file_with_duckdb(uploaded_file)
+            if data is None:
+                data = self._load_file_with_duckdb(uploaded_file)
             
             if data is None:
                 return False, "Erro ao processar arquivo"
@@ -64,20 +79,23 @@ class S3UploaderService:
             # Converter para CSV e fazer upload
             csv_content = self._dataframe_to_csv(data)
             
-            # Upload para S3
+            # Upload para S3 (multipart com concorrência para arquivos grandes)
             credentials = s3_config.get_credentials()
-            self.s3_client.put_object(
-                Bucket=credentials['bucket_name'],
-                Key=s3_key,
-                Body=csv_content.encode('utf-8'),
-                ContentType='text/csv',
-                Metadata={
-                    'subject': subject,
-                    'sub_subject': sub_subject,
-                    'original_filename': uploaded_file.name,
-                    'upload_date': datetime.now().isoformat(),
-                    'schema_used': schema.get('description', 'N/A')
-                }
+            self.s3_client.upload_fileobj(
+                io.BytesIO(csv_content),
+                credentials['bucket_name'],
+                s3_key,
+                ExtraArgs={
+                    'ContentType': 'text/csv',
+                    'Metadata': {
+                        'subject': subject,
+                        'sub_subject': sub_subject,
+                        'original_filename': uploaded_file.name,
+                        'upload_date': datetime.now().isoformat(),
+                        'schema_used': schema.get('description', 'N/A')
+                    }
+                },
+                Config=UPLOAD_TRANSFER_CONFIG
             )
             
             return True, f"Upload realizado com sucesso: {s3_key}"
@@ -90,11 +108,6 @@ class S3UploaderService:
         file_extension = uploaded_file.name.split('.')[-1].lower()
         
         try:
-            # Salvar arquivo temporariamente
-            temp_path = f"/tmp/temp_upload_{uploaded_file.name}"
-            with open(temp_path, "wb") as f:
-                f.write(uploaded_file.getvalue())
-            
             if file_extension == 'csv':
                 # Auto-detectar separador
                 sample = uploaded_file.read(1024).decode('utf-8', errors='ignore')
@@ -104,14 +117,16 @@ class S3UploaderService:
                 separator_counts = {sep: sample.count(sep) for sep in separators}
                 best_sep = max(separator_counts, key=separator_counts.get) if separator_counts else ','
                 
-                result = self.conn.execute(f"""
-                    SELECT * FROM read_csv('{temp_path}', 
-                                         delim='{best_sep}', 
-                                         header=true)
-                """).fetchall()
-                
-                # Obter nomes das colunas
-                columns = [desc[0] for desc in self.conn.description]
+                # Arquivo temporário só para o DuckDB, removido mesmo se a leitura falhar
+                with spilled_to_tmp(uploaded_file) as temp_path, self._conn_lock:
+                    # Caminho e separador como parâmetros (nomes de arquivo com aspas são seguros)
+                    result = self.conn.execute(
+                        "SELECT * FROM read_csv(?, delim = ?, header = true)",
+                        [temp_path, best_sep]
+                    ).fetchall()
+                    
+                    # Obter nomes das colunas
+                    columns = [desc[0] for desc in self.conn.description]
                 
                 # Converter para lista de dicionários
                 data = []
@@ -120,12 +135,7 @@ class S3UploaderService:
                     data.append(row_dict)
                 
             elif file_extension in ['xlsx', 'xls']:
-                result = self.conn.execute(f"""
-                    SELECT * FROM read_excel('{temp_path}', header=true)
-                """).fetchall()
-                
-                # Obter nomes das colunas
-                columns = [desc[0] for desc in self.conn.description]
+                columns, result, _ = read_excel_sheet(uploaded_file)
                 
                 # Converter para lista de dicionários
                 data = []
@@ -135,52 +145,26 @@ class S3UploaderService:
             else:
                 return None
             
-            # Limpar arquivo temporário
-            if os.path.exists(temp_path):
-                os.remove(temp_path)
-            
             return data
             
         except Exception as e:
             st.error(f"Erro ao carregar arquivo: {e}")
             return None
     
-    def _dataframe_to_csv(self, data: List[Dict]) -> str:
-        """Converte lista de dicionários para CSV string"""
-        try:
-            if not data:
-                return ""
-            
-            # Registrar dados no DuckDB
-            self.conn.register('temp_data', data)
-            
-            # Exportar como CSV
-            csv_result = self.conn.execute("COPY temp_data TO '/tmp/export.csv' (HEADER, DELIMITER ',')").fetchall()
-            
-            # Ler o arquivo gerado
-            with open('/tmp/export.csv', 'r', encoding='utf-8') as f:
-                csv_content = f.read()
-            
-            # Limpar arquivo temporário
-            if os.path.exists('/tmp/export.csv'):
-                os.remove('/tmp/export.csv')
-            
-            return csv_content
-            
-        except Exception as e:
-            # Fallback: criar CSV manualmente
-            if not data:
-                return ""
-            
-            import csv
-            import io
-            
-            output = io.StringIO()
-            writer = csv.DictWriter(output, fieldnames=data[0].keys())
-            writer.writeheader()
-            writer.writerows(data)
-            
-            return output.getvalue()
+    def _dataframe_to_csv(self, data: List[Dict]) -> bytes:
+        """Converte lista de dicionários para CSV (bytes UTF-8), com aspas só quando necessário"""
+        if not data:
+            return b""
+        
+        columns = list(data[0].keys())
+        
+        # Um único writer (implementado em C) para cabeçalho e linhas: mesmo formato em qualquer arquivo
+        output = io.StringIO()
+        writer = csv.writer(output, lineterminator='\n')
+        writer.writerow(columns)
+        writer.writerows([row.get(column) for column in columns] for row in data)
+        
+        return output.getvalue().encode('utf-8')
     
     def _generate_s3_path(self, filename: str, subject: str, sub_subject: str) -> str:
         """Gera path estruturado para S3"""
@@ -238,6 +222,12 @@ class S3UploaderService:
             return []
 
 
+@st.cache_resource
+def get_uploader_service() -> S3UploaderService:
+    """Retorna instância do serviço de upload compartilhada entre reruns"""
+    return S3UploaderService()
+
+
 # Função de conveniência para compatibilidade
 def upload_file_to_s3(uploaded_file, schema_data, subject, sub_subject):
     """Função wrapper para compatibilidade com código existente"""
@@ -5,6 +5,48 @@ import os
 from typing import Dict, List, Any, Optional
 from datetime import datetime
 import re
+import pandas as pd
+
+try:
+    # Binding C da libyaml (bem mais rápido que o loader puro Python)
+    from yaml import CSafeLoader as SafeLoader
+except ImportError:
+    from yaml import SafeLoader
+
+DATE_FORMATS = [
+    '%Y-%m-%d',
+    '%d/%m/%Y',
+    '%m/%d/%Y',
+    '%Y/%m/%d',
+    '%d-%m-%Y',
+    '%m-%d-%Y'
+]
+
+DATETIME_FORMATS = [
+    '%Y-%m-%d %H:%M:%S',
+    '%Y-%m-%d %H:%M',
+    '%d/%m/%Y %H:%M:%S',
+    '%d/%m/%Y %H:%M',
+    '%Y-%m-%dT%H:%M:%S',
+    '%Y-%m-%dT%H:%M:%SZ'
+]
+
+BOOLEAN_VALUES = ['true', 'false', '1', '0', 'yes', 'no', 'sim', 'não']
+
+# Quantidade de linhas validadas por bloco
+VALIDATION_CHUNK_SIZE = 100_000
+
+
+@st.cache_data(ttl=300, show_spinner=False)
+def _cached_load_schema(path: str, mtime: float) -> Optional[Dict]:
+    """Faz parse de um arquivo YAML de schema (cache invalidado pelo mtime)"""
+    with open(path, 'r', encoding='utf-8') as file:
+        return yaml.load(file, Loader=SafeLoader)
+
+
+def _load_schema_file(path: str) -> Optional[Dict]:
+    """Carrega schema YAML reaproveitando o parse entre reruns do Streamlit"""
+    return _cached_load_schema(path, os.path.getmtime(path))
 
 
 class ValidationService:
@@ -30,18 +72,16 @@ class ValidationService:
             for filename in os.listdir(schema_dir):
                 if filename.endswith('.yaml') or filename.endswith('.yml'):
                     file_path = os.path.join(schema_dir, filename)
+                    schema = _load_schema_file(file_path)
                     
-                    with open(file_path, 'r', encoding='utf-8') as file:
-                        schema = yaml.safe_load(file)
-                        
-                        subject = schema.get('subject', 'Indefinido')
-                        sub_subject = schema.get('sub_subject', filename.replace('.yaml', '').replace('.yml', ''))
-                        
-                        if subject not in subjects_data:
-                            subjects_data[subject] = []
-                        
-                        if sub_subject not in subjects_data[subject]:
-                            subjects_data[subject].append(sub_subject)
+                    subject = schema.get('subject', 'Indefinido')
+                    sub_subject = schema.get('sub_subject', filename.replace('.yaml', '').replace('.yml', ''))
+                    
+                    if subject not in subjects_data:
+                        subjects_data[subject] = []
+                    
+                    if sub_subject not in subjects_data[subject]:
+                        subjects_data[subject].append(sub_subject)
         
         except Exception as e:
             st.error(f"Erro ao carregar schemas: {e}")
@@ -67,15 +107,13 @@ class ValidationService:
             for filename in os.listdir(schema_dir):
                 if filename.endswith('.yaml') or filename.endswith('.yml'):
                     file_path = os.path.join(schema_dir, filename)
+                    schema = _load_schema_file(file_path)
                     
-                    with open(file_path, 'r', encoding='utf-8') as file:
-                        schema = yaml.safe_load(file)
+                    if (schema.get('subject') == subject and 
+                        schema.get('sub_subject') == sub_subject):
                         
-                        if (schema.get('subject') == subject and 
-                            schema.get('sub_subject') == sub_subject):
-                            
-                            self.schema_cache[cache_key] = schema
-                            return schema
+                        self.schema_cache[cache_key] = schema
+                        return schema
         
         except Exception as e:
             st.error(f"Erro ao carregar schema: {e}")
@@ -84,7 +122,7 @@ class ValidationService:
     
     def validate_data(self, data_dict: List[Dict], schema: Dict) -> List[str]:
         """
-        Valida dados contra um schema YAML usando validação Python
+        Valida dados contra um schema YAML usando operações vetorizadas do pandas
         
         Args:
             data_dict: Lista de dicionários com dados para validar
@@ -105,93 +143,130 @@ class ValidationService:
             # Obter campos do schema
             schema_fields = schema.get('schema', {}).get('fields', [])
             required_fields = [field['name'] for field in schema_fields if field.get('required', False)]
+            typed_fields = [
+                (field['name'], field.get('type', 'string'))
+                for field in schema_fields if field['name'] in columns
+            ]
+            
+            null_counts = {field_name: 0 for field_name in required_fields if field_name in columns}
+            type_errors = [[] for _ in typed_fields]
+            
+            # Validar em blocos para limitar a memória do DataFrame em arquivos grandes
+            for offset in range(0, len(data_dict), VALIDATION_CHUNK_SIZE):
+                df = pd.DataFrame(data_dict[offset:offset + VALIDATION_CHUNK_SIZE], columns=columns)
+                df.index += offset
+                
+                # Contar valores nulos/vazios dos campos obrigatórios
+                for field_name in null_counts:
+                    series = df[field_name]
+                    null_mask = series.isna() | series.astype(str).str.strip().eq('')
+                    null_counts[field_name] += int(null_mask.sum())
+                
+                # Validar tipos de dados
+                for i, (field_name, field_type) in enumerate(typed_fields):
+                    type_errors[i].extend(
+                        self._validate_field_type(field_name, field_type, df[field_name], data_dict)
+                    )
             
             # Validar campos obrigatórios
             for field_name in required_fields:
                 if field_name not in columns:
                     errors.append(f"Campo obrigatório ausente: {field_name}")
-                else:
-                    # Verificar se há valores nulos/vazios nas linhas
-                    null_count = 0
-                    for i, row in enumerate(data_dict):
-                        value = row.get(field_name)
-                        if value is None or str(value).strip() == '':
-                            null_count += 1
-                    
-                    if null_count > 0:
-                        errors.append(f"Campo obrigatório '{field_name}' possui {null_count} valor(es) vazio(s)")
+                elif null_counts[field_name] > 0:
+                    errors.append(f"Campo obrigatório '{field_name}' possui {null_counts[field_name]} valor(es) vazio(s)")
             
-            # Validar tipos de dados
-            for field in schema_fields:
-                field_name = field['name']
-                field_type = field.get('type', 'string')
-                
-                if field_name in columns:
-                    field_errors = self._validate_field_type(field_name, field_type, data_dict)
-                    errors.extend(field_errors)
+            for field_errors in type_errors:
+                errors.extend(field_errors)
             
             return errors
             
         except Exception as e:
             return [f"Erro durante validação: {str(e)}"]
     
-    def _validate_field_type(self, field_name: str, field_type: str, data_dict: List[Dict]) -> List[str]:
+    def _validate_field_type(self, field_name: str, field_type: str, series: pd.Series, data_dict: List[Dict]) -> List[str]:
         """Valida tipo de dados de um campo específico"""
         errors = []
         
         try:
-            for i, row in enumerate(data_dict):
-                value = row.get(field_name)
-                
-                if value is None or value == '':
-                    continue  # Valores vazios já são tratados na validação de obrigatórios
-                
-                if field_type in ['int', 'integer']:
-                    if not self._is_integer(value):
-                        errors.append(f"Linha {i+1}: '{field_name}' deve ser um número inteiro (valor: {value})")
-                
-                elif field_type in ['float', 'number', 'double']:
-                    if not self._is_number(value):
-                        errors.append(f"Linha {i+1}: '{field_name}' deve ser um número (valor: {value})")
-                
-                elif field_type in ['date']:
-                    if not self._is_date(value):
-                        errors.append(f"Linha {i+1}: '{field_name}' deve ser uma data válida (valor: {value})")
-                
-                elif field_type in ['datetime', 'timestamp']:
-                    if not self._is_datetime(value):
-                        errors.append(f"Linha {i+1}: '{field_name}' deve ser uma data/hora válida (valor: {value})")
-                
-                elif field_type in ['bool', 'boolean']:
-                    if not self._is_boolean(value):
-                        errors.append(f"Linha {i+1}: '{field_name}' deve ser um valor booleano (valor: {value})")
-                
+            if field_type in ['int', 'integer']:
+                valid_mask = self._integer_mask(series)
+                message = "deve ser um número inteiro"
+            elif field_type in ['float', 'number', 'double']:
+                valid_mask = self._number_mask(series)
+                message = "deve ser um número"
+            elif field_type in ['date']:
+                valid_mask = self._datetime_mask(series, DATE_FORMATS)
+                message = "deve ser uma data válida"
+            elif field_type in ['datetime', 'timestamp']:
+                valid_mask = self._datetime_mask(series, DATETIME_FORMATS)
+                message = "deve ser uma data/hora válida"
+            elif field_type in ['bool', 'boolean']:
+                valid_mask = self._boolean_mask(series)
+                message = "deve ser um valor booleano"
+            else:
                 # field_type 'string' não precisa validação específica
+                return errors
+            
+            # Valores vazios já são tratados na validação de obrigatórios
+            empty_mask = series.isna() | series.eq('')
+            invalid_rows = series.index[~(valid_mask | empty_mask)]
+            
+            for i in invalid_rows:
+                value = data_dict[i].get(field_name)
+                errors.append(f"Linha {i+1}: '{field_name}' {message} (valor: {value})")
                 
         except Exception as e:
             errors.append(f"Erro ao validar campo '{field_name}': {str(e)}")
         
         return errors
     
+    def _integer_mask(self, series: pd.Series) -> pd.Series:
+        """Máscara de valores que representam inteiros válidos (mesma regra de int())"""
+        if pd.api.types.is_bool_dtype(series):
+            return pd.Series(False, index=series.index)
+        
+        if pd.api.types.is_numeric_dtype(series):
+            return series.notna()
+        
+        # Caminho rápido para o caso comum; o que não casar (ex.: '1_000', 1.5 em coluna
+        # mista) é conferido valor a valor com int(), como antes
+        valid_mask = series.astype(str).str.fullmatch(r'\s*[+-]?\d+\s*').fillna(False)
+        return self._recheck(series, valid_mask, self._is_integer)
+    
+    def _number_mask(self, series: pd.Series) -> pd.Series:
+        """Máscara de valores que representam números válidos (mesma regra de float())"""
+        if pd.api.types.is_bool_dtype(series):
+            return pd.Series(False, index=series.index)
+        
+        if pd.api.types.is_numeric_dtype(series):
+            return series.notna()
+        
+        # Caminho rápido com to_numeric; recusados (ex.: 'nan', '1_000') passam por float()
+        is_bool = series.map(type).eq(bool)
+        valid_mask = pd.to_numeric(series.astype(str).str.strip(), errors='coerce').notna() & ~is_bool
+        return self._recheck(series, valid_mask, self._is_number)
+    
+    def _recheck(self, series: pd.Series, valid_mask: pd.Series, predicate) -> pd.Series:
+        """Confere com o predicado escalar apenas os valores recusados pela máscara vetorizada"""
+        rejected = ~valid_mask
+        if rejected.any():
+            valid_mask = valid_mask.copy()
+            valid_mask[rejected] = series[rejected].map(predicate).astype(bool)
+        return valid_mask
+    
     def _is_integer(self, value) -> bool:
         """Verifica se valor é um inteiro válido"""
-        if value is None or (isinstance(value, str) and value.strip() == ''):
-            return False
-        
         if isinstance(value, bool):
             return False
         
         try:
             int(value)
             return True
-        except (ValueError, TypeError):
+        except (ValueError, TypeError, OverflowError):
             return False
     
     def _is_number(self, value) -> bool:
         """Verifica se valor é um número válido"""
-        if value is None or (isinstance(value, str) and value.strip() == ''):
-            return False
-        
         if isinstance(value, bool):
             return False
         
@@ -201,83 +276,38 @@ class ValidationService:
         except (ValueError, TypeError):
             return False
     
-    def _is_date(self, value) -> bool:
-        """Verifica se valor é uma data válida"""
-        if value is None or (isinstance(value, str) and value.strip() == ''):
-            return False
-        
-        if isinstance(value, datetime):
-            return True
+    def _datetime_mask(self, series: pd.Series, formats: List[str]) -> pd.Series:
+        """Máscara de valores que correspondem a algum dos formatos de data informados"""
+        if pd.api.types.is_datetime64_any_dtype(series):
+            return series.notna()
         
-        try:
-            # Tentar diferentes formatos de data
-            date_formats = [
-                '%Y-%m-%d',
-                '%d/%m/%Y',
-                '%m/%d/%Y',
-                '%Y/%m/%d',
-                '%d-%m-%Y',
-                '%m-%d-%Y'
-            ]
-            
-            for fmt in date_formats:
-                try:
-                    datetime.strptime(str(value), fmt)
-                    return True
-                except ValueError:
-                    continue
-            
-            return False
-        except Exception:
-            return False
-    
-    def _is_datetime(self, value) -> bool:
-        """Verifica se valor é uma data/hora válida"""
-        if value is None or (isinstance(value, str) and value.strip() == ''):
-            return False
+        is_datetime = series.map(type).isin([datetime, pd.Timestamp])
+        str_values = series.astype(str)
         
-        if isinstance(value, datetime):
-            return True
+        valid_mask = is_datetime
+        for fmt in formats:
+            valid_mask = valid_mask | pd.to_datetime(str_values, format=fmt, errors='coerce').notna()
         
-        try:
-            # Tentar diferentes formatos de datetime
-            datetime_formats = [
-                '%Y-%m-%d %H:%M:%S',
-                '%Y-%m-%d %H:%M',
-                '%d/%m/%Y %H:%M:%S',
-                '%d/%m/%Y %H:%M',
-                '%Y-%m-%dT%H:%M:%S',
-                '%Y-%m-%dT%H:%M:%SZ'
-            ]
-            
-            for fmt in datetime_formats:
-                try:
-                    datetime.strptime(str(value), fmt)
-                    return True
-                except ValueError:
-                    continue
-            
-            return False
-        except Exception:
-            return False
+        return valid_mask
     
-    def _is_boolean(self, value) -> bool:
-        """Verifica se valor é um booleano válido"""
-        if value is None or (isinstance(value, str) and value.strip() == ''):
-            return False
-        
-        if isinstance(value, bool):
-            return True
+    def _boolean_mask(self, series: pd.Series) -> pd.Series:
+        """Máscara de valores que representam booleanos válidos"""
+        if pd.api.types.is_bool_dtype(series):
+            return series.notna()
         
-        # Verificar strings que representam booleanos
-        if isinstance(value, str):
-            return value.lower() in ['true', 'false', '1', '0', 'yes', 'no', 'sim', 'não']
+        if pd.api.types.is_numeric_dtype(series):
+            return series.isin([0, 1])
         
-        # Verificar números que representam booleanos
-        if isinstance(value, (int, float)):
-            return value in [0, 1]
+        value_types = series.map(type)
+        is_bool = value_types.eq(bool)
+        is_str = value_types.eq(str)
+        is_number = value_types.isin([int, float])
         
-        return False
+        return (
+            is_bool
+            | (is_str & series.astype(str).str.lower().isin(BOOLEAN_VALUES))
+            | (is_number & series.isin([0, 1]))
+        )
 
 
 # Funções de conveniência para compatibilidade
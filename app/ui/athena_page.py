@@ -1,10 +1,13 @@
 import streamlit as st
 import duckdb
+import logging
 from typing import Dict, List, Any, Optional
 from app.services.athena_service import AthenaService
 from app.config.s3_config import s3_config
 import time
 
+logger = logging.getLogger(__name__)
+
 
 class AthenaPageComponent:
     """Componente da página Athena para edição de tabelas"""
@@ -453,7 +456,7 @@ class AthenaPageComponent:
                     
                 except Exception as e:
                     # Em caso de erro na comparação, assume que houve mudança
-                    print(f"Erro na comparação de dados: {e}")
+                    logger.error("Erro na comparação de dados: %s", e)
                     return True
             
             # Usar a função auxiliar para verificar mudanças
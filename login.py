@@ -4,6 +4,10 @@ Página principal de login - Data Platform
 
 import streamlit as st
 from app.ui.login_page import render_login_page
+from app.config.logging_config import setup_logging_once
+
+# Logs da aplicação (fila + thread dedicada)
+setup_logging_once()
 
 # Configuração da página principal
 st.set_page_config(